@@ -2,6 +2,7 @@ from io import BytesIO
 from fastapi import Response
 import torch
 import time
+import os
 import litserve as ls
 from optimum.quanto import freeze, qfloat8, quantize
 from diffusers import FlowMatchEulerDiscreteScheduler, AutoencoderKL
@@ -9,6 +10,15 @@ from diffusers.models.transformers.transformer_flux import FluxTransformer2DMode
 from diffusers.pipelines.flux.pipeline_flux import FluxPipeline
 from transformers import CLIPTextModel, CLIPTokenizer,T5EncoderModel, T5TokenizerFast
 
+# Requests arriving within BATCH_TIMEOUT seconds of each other share one pipeline call
+MAX_BATCH_SIZE = int(os.environ.get("FLUX_MAX_BATCH_SIZE", 4))
+BATCH_TIMEOUT = float(os.environ.get("FLUX_BATCH_TIMEOUT", 0.05))
+
+DEFAULT_WIDTH = 1024
+DEFAULT_HEIGHT = 1024
+DEFAULT_STEPS = 4
+DEFAULT_GUIDANCE = 1.0
+
 class FluxLitAPI(ls.LitAPI):
     def setup(self, device):
         # Load the model
@@ -42,21 +52,55 @@ class FluxLitAPI(ls.LitAPI):
 
     def decode_request(self, request):
         # Extract prompt from request
-        prompt = request["prompt"]
-        return prompt
-
-    def predict(self, prompt):
-        # Generate image from prompt
-        image = self.pipe(
-            prompt=prompt, 
-            width=1024,
-            height=1024,
-            num_inference_steps=4, 
-            generator=torch.Generator().manual_seed(int(time.time())),
-            guidance_scale=1.0,
-        ).images[0]
-
-        return image
+        return {
+            "prompt": request["prompt"],
+            "width": DEFAULT_WIDTH,
+            "height": DEFAULT_HEIGHT,
+            "num_inference_steps": DEFAULT_STEPS,
+            "guidance_scale": DEFAULT_GUIDANCE,
+            "seed": request.get("seed"),
+        }
+
+    def batch(self, inputs):
+        # Requests stay separate dicts; predict groups them by shape
+        return inputs
+
+    @staticmethod
+    def batch_key(request):
+        return (request["width"], request["height"], request["num_inference_steps"], request["guidance_scale"])
+
+    def predict(self, requests):
+        # Without batching LitServe passes a single request
+        single = isinstance(requests, dict)
+        if single:
+            requests = [requests]
+
+        # Only requests with the same size, steps and guidance can share a pipeline call
+        groups = {}
+        for index, request in enumerate(requests):
+            groups.setdefault(self.batch_key(request), []).append(index)
+
+        # Each request needs its own seed, or identical prompts in one batch give identical images
+        now = time.time_ns()
+        seeds = [request["seed"] if request["seed"] is not None else (now + index) % 2**63 for index, request in enumerate(requests)]
+
+        images = [None] * len(requests)
+        for (width, height, steps, guidance), indices in groups.items():
+            output = self.pipe(
+                prompt=[requests[i]["prompt"] for i in indices],
+                width=width,
+                height=height,
+                num_inference_steps=steps,
+                generator=[torch.Generator().manual_seed(int(seeds[i])) for i in indices],
+                guidance_scale=guidance,
+            ).images
+            for index, image in zip(indices, output):
+                images[index] = image
+
+        return images[0] if single else images
+
+    def unbatch(self, images):
+        return images
 
     def encode_response(self, image):
         buffered = BytesIO()
@@ -66,5 +110,5 @@ class FluxLitAPI(ls.LitAPI):
 # Starting the server
 if __name__ == "__main__":
     api = FluxLitAPI()
-    server = ls.LitServer(api, timeout=False)
+    server = ls.LitServer(api, timeout=False, max_batch_size=MAX_BATCH_SIZE, batch_timeout=BATCH_TIMEOUT)
     server.run(port=8000)
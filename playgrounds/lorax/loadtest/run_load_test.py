@@ -0,0 +1,286 @@
+"""Replay a prompt mix across LoRAX adapters and report latency per adapter.
+
+Run from playgrounds/lorax:
+
+    python loadtest/run_load_test.py --adapters org/a,org/b,org/c --concurrency 8 --requests 200
+    python loadtest/run_load_test.py --adapters org/a:3,org/b,base --rate 4 --duration 60 --output report.json
+    python loadtest/run_load_test.py --stub --adapters a,b,c,d,e --adapter-slots 3
+
+--concurrency keeps that many requests in flight (closed loop); --rate sends
+requests at that many per second with Poisson arrivals whatever the server does
+(open loop). Each adapter reports time to first token (TTFT), time per output token
+(TPOT) and end-to-end latency. A request counts as cold when it was sent before any
+request for its adapter had produced a token, i.e. it waited for the adapter to load;
+a later request whose TTFT exceeds --reload-factor times the lowest per-adapter warm
+median is counted as a reload (the adapter was probably evicted). The base model is always
+loaded, so its requests are never cold or reloads. --stub runs against a local
+stub server with simulated adapter loading instead of a real endpoint.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PLAYGROUND_DIR = os.path.dirname(LOADTEST_DIR)
+sys.path.insert(0, PLAYGROUND_DIR)
+sys.path.insert(0, LOADTEST_DIR)
+# Code shared by the playgrounds lives next to them
+sys.path.insert(0, os.path.join(PLAYGROUND_DIR, "..", "shared"))
+
+from lorax_client import LoraxClient, generate_response
+from stub_lorax import StubLoraxServer
+
+DEFAULT_PROMPTS = [
+    "Summarize the benefits of low-rank adaptation in two sentences.",
+    "Write a haiku about GPUs.",
+    "Explain continuous batching to a new engineer.",
+    "List three ways to reduce time to first token.",
+    "Translate 'the model is loading' into French and German.",
+    "What is the capital of Australia? Answer in one word.",
+]
+BASE_MODEL = ""
+
+def load_prompts(path: Optional[str]) -> List[str]:
+    """One prompt per line, or JSON lines with a "prompt" field."""
+    if not path:
+        return DEFAULT_PROMPTS
+    prompts = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            prompts.append(json.loads(line)["prompt"] if line.startswith("{") else line)
+    return prompts
+
+def parse_adapters(text: str) -> List[Tuple[str, float]]:
+    """'org/a:3,org/b,base' -> [('org/a', 3.0), ('org/b', 1.0), ('', 1.0)]; 'base' is the base model."""
+    adapters = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        adapter_id, _, weight = item.rpartition(":")
+        try:
+            weight = float(weight)
+        except ValueError:
+            # No weight, or a colon that is part of the ID such as s3://bucket/adapter
+            adapter_id, weight = item, 1.0
+        adapters.append((BASE_MODEL if adapter_id == "base" else adapter_id, weight))
+    return adapters
+
+def adapter_label(adapter_id: str) -> str:
+    return adapter_id or "base"
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+class LoadTest:
+    def __init__(self, client: LoraxClient, prompts: List[str], adapters: List[Tuple[str, float]], generation_kwargs: Dict[str, Any],
+                 seed: int = 0):
+        self.client = client
+        self.prompts = prompts
+        self.adapter_ids = [adapter_id for adapter_id, _ in adapters]
+        self.weights = [weight for _, weight in adapters]
+        self.generation_kwargs = generation_kwargs
+        self.random = random.Random(seed)
+        # Adapters that have produced a token, so later requests for them find them loaded
+        self.warm_adapters = set()
+        self.results: List[Dict[str, Any]] = []
+
+    def next_request(self) -> Tuple[str, str]:
+        return self.random.choice(self.prompts), self.random.choices(self.adapter_ids, self.weights)[0]
+
+    async def timed_request(self, prompt: str, adapter_id: str):
+        cold = adapter_id != BASE_MODEL and adapter_id not in self.warm_adapters
+        result = {"adapter_id": adapter_id, "cold": cold, "tokens": 0, "error": None}
+        start = time.perf_counter()
+        first_token = None
+        try:
+            async for _ in generate_response(self.client, prompt, adapter_id=adapter_id, **self.generation_kwargs):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    self.warm_adapters.add(adapter_id)
+                result["tokens"] += 1
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+        end = time.perf_counter()
+        result["e2e_s"] = end - start
+        if first_token is not None:
+            result["ttft_s"] = first_token - start
+            if result["tokens"] > 1:
+                result["tpot_s"] = (end - first_token) / (result["tokens"] - 1)
+        self.results.append(result)
+
+    async def run_closed(self, concurrency: int, requests: Optional[int], duration: Optional[float]):
+        """Keep `concurrency` requests in flight until `requests` were sent or `duration` passed."""
+        deadline = time.perf_counter() + duration if duration else None
+        sent = 0
+
+        async def worker():
+            nonlocal sent
+            while (requests is None or sent < requests) and (deadline is None or time.perf_counter() < deadline):
+                sent += 1
+                await self.timed_request(*self.next_request())
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_open(self, rate: float, requests: Optional[int], duration: Optional[float], max_in_flight: int):
+        """Start requests with exponential gaps averaging 1 / rate, however long they take."""
+        deadline = time.perf_counter() + duration if duration else None
+        in_flight = asyncio.Semaphore(max_in_flight)
+        tasks = []
+
+        async def send(prompt: str, adapter_id: str):
+            async with in_flight:
+                await self.timed_request(prompt, adapter_id)
+
+        while (requests is None or len(tasks) < requests) and (deadline is None or time.perf_counter() < deadline):
+            tasks.append(asyncio.create_task(send(*self.next_request())))
+            await asyncio.sleep(self.random.expovariate(rate))
+        await asyncio.gather(*tasks)
+
+def summarize(results: List[Dict[str, Any]], elapsed: float, reload_factor: float) -> Dict[str, Any]:
+    by_adapter: Dict[str, List[Dict[str, Any]]] = {}
+    for result in results:
+        by_adapter.setdefault(result["adapter_id"], []).append(result)
+    # Warm TTFT of the adapter that stayed loaded best; with more adapters than cache slots
+    # most requests for the others are reloads, so their own median would hide them
+    warm_medians = [statistics.median(ttfts) for ttfts in (
+        [result["ttft_s"] for result in group if "ttft_s" in result and not result["cold"]] for group in by_adapter.values()) if ttfts]
+    baseline = min(warm_medians, default=None)
+    for result in results:
+        # A warm request far slower than the baseline most likely waited for its adapter to be reloaded
+        result["reload"] = bool(reload_factor and baseline and not result["cold"] and result["adapter_id"] != BASE_MODEL
+                                and result.get("ttft_s", 0.0) > reload_factor * baseline)
+
+    def stats(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ok = [result for result in group if not result["error"] and "ttft_s" in result]
+        cold = [result["ttft_s"] for result in ok if result["cold"]]
+        reloads = [result["ttft_s"] for result in ok if result["reload"]]
+        warm = [result["ttft_s"] for result in ok if not result["cold"] and not result["reload"]]
+        tpot = [result["tpot_s"] for result in ok if "tpot_s" in result]
+        e2e = [result["e2e_s"] for result in ok]
+        cold_median = statistics.median(cold + reloads) if cold or reloads else None
+        return {
+            "requests": len(group),
+            "errors": sum(1 for result in group if result["error"]),
+            "cold_requests": len(cold),
+            "reloads": len(reloads),
+            "tokens": sum(result["tokens"] for result in group),
+            "ttft_cold_p50_s": cold_median,
+            "ttft_warm_p50_s": percentile(warm, 0.5),
+            "ttft_warm_p95_s": percentile(warm, 0.95),
+            # Noise can put a lone cold request under the warm median; a load never takes negative time
+            "adapter_load_s": max(0.0, cold_median - statistics.median(warm)) if cold_median is not None and warm else None,
+            "tpot_p50_s": percentile(tpot, 0.5),
+            "tpot_p95_s": percentile(tpot, 0.95),
+            "e2e_p50_s": percentile(e2e, 0.5),
+            "e2e_p95_s": percentile(e2e, 0.95),
+            "first_error": next((result["error"] for result in group if result["error"]), None),
+        }
+
+    overall = stats(results)
+    overall["elapsed_s"] = elapsed
+    overall["requests_per_second"] = len(results) / elapsed if elapsed else None
+    overall["tokens_per_second"] = overall["tokens"] / elapsed if elapsed else None
+    return {
+        "overall": overall,
+        "adapters": {adapter_label(adapter_id): stats(group) for adapter_id, group in sorted(by_adapter.items())},
+    }
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1e3:.0f}"
+
+def print_table(summary: Dict[str, Any]):
+    columns = ["requests", "errors", "cold_requests", "reloads", "ttft_cold_p50_s", "ttft_warm_p50_s", "ttft_warm_p95_s",
+               "adapter_load_s", "tpot_p50_s", "e2e_p50_s", "e2e_p95_s"]
+    headers = ["reqs", "errs", "cold", "reload", "ttft cold", "ttft p50", "ttft p95", "load", "tpot p50", "e2e p50", "e2e p95"]
+    rows = list(summary["adapters"].items()) + [("overall", summary["overall"])]
+    width = max(len(name) for name, _ in rows)
+    print(f"{'adapter':{width}s} " + " ".join(f"{header:>9s}" for header in headers) + "   (times in ms)", file=sys.stderr)
+    for name, stats in rows:
+        cells = [str(stats[column]) if not column.endswith("_s") else format_ms(stats[column]) for column in columns]
+        print(f"{name:{width}s} " + " ".join(f"{cell:>9s}" for cell in cells), file=sys.stderr)
+    overall = summary["overall"]
+    print(f"{overall['requests_per_second']:.2f} requests/s, {overall['tokens_per_second']:.1f} tokens/s over {overall['elapsed_s']:.1f} s",
+          file=sys.stderr)
+    for name, stats in summary["adapters"].items():
+        if stats["first_error"]:
+            print(f"{name}: {stats['errors']} error(s), first: {stats['first_error']}", file=sys.stderr)
+
+async def run(args, endpoint_url: str) -> Dict[str, Any]:
+    client = LoraxClient(endpoint_url, max_connections=max(args.concurrency or 0, args.max_in_flight))
+    generation_kwargs = {"max_new_tokens": args.max_new_tokens, "temperature": args.temperature, "adapter_source": args.adapter_source}
+    load_test = LoadTest(client, load_prompts(args.prompts), parse_adapters(args.adapters), generation_kwargs, args.seed)
+    requests = args.requests if args.requests or args.duration else 100
+    start = time.perf_counter()
+    try:
+        if args.rate:
+            await load_test.run_open(args.rate, requests, args.duration, args.max_in_flight)
+        else:
+            await load_test.run_closed(args.concurrency or 1, requests, args.duration)
+    finally:
+        await client.close()
+    return summarize(load_test.results, time.perf_counter() - start, args.reload_factor)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", default="http://127.0.0.1:8080", help="LoRAX endpoint URL")
+    parser.add_argument("--adapters", default="base", help="Comma-separated adapter IDs, each optionally :weight; 'base' is the base model")
+    parser.add_argument("--adapter-source", default="hub")
+    parser.add_argument("--prompts", help="File with one prompt per line (or JSON lines with a 'prompt' field)")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, help="Requests kept in flight (default 1)")
+    load.add_argument("--rate", type=float, help="Requests started per second, Poisson arrivals")
+    parser.add_argument("--requests", type=int, help="Total requests to send (default 100 unless --duration is set)")
+    parser.add_argument("--duration", type=float, help="Stop sending after this many seconds")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Cap on concurrent requests with --rate")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--reload-factor", type=float, default=3.0, help="Warm TTFT above this times the best adapter's median counts as a reload; 0 disables")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the prompt/adapter mix and arrival times")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    stub = parser.add_argument_group("stub server")
+    stub.add_argument("--stub", action="store_true", help="Run against a local stub server instead of --endpoint")
+    stub.add_argument("--adapter-slots", type=int, default=4, help="Adapters the stub keeps loaded")
+    stub.add_argument("--adapter-load-time", type=float, default=1.0, help="Seconds the stub takes to load an adapter")
+    args = parser.parse_args()
+
+    server = None
+    endpoint_url = args.endpoint
+    if args.stub:
+        server = StubLoraxServer(adapter_slots=args.adapter_slots, adapter_load_time=args.adapter_load_time).start()
+        endpoint_url = server.url
+    try:
+        summary = asyncio.run(run(args, endpoint_url))
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "endpoint": "stub" if args.stub else endpoint_url,
+        "settings": {name: value for name, value in vars(args).items() if name not in ("output", "endpoint")},
+        "summary": summary,
+    }
+    print_table(summary)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+class StubLoraxHandler(BaseHTTPRequestHandler):
+    """Answers /generate, /generate_stream and /metrics like LoRAX, with simulated timings."""
+    protocol_version = "HTTP/1.1"
+    # Tokens go out as small chunks; without TCP_NODELAY delayed ACKs add ~40 ms to each request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def token(self, index: int, word: str) -> Dict:
+        return {"id": index, "text": word, "logprob": -0.1, "special": False}
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        self.send_body(self.server.metrics_text().encode(), "text/plain; version=0.0.4")
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path not in ("/generate", "/generate_stream"):
+            self.send_error(404)
+            return
+        parameters = request.get("parameters") or {}
+        adapter_id = parameters.get("adapter_id") or ""
+        if adapter_id in self.server.failing_adapters:
+            body = json.dumps({"error": f"Adapter {adapter_id} not found", "error_type": "download"}).encode()
+            self.send_body(body, "application/json", 400)
+            return
+        max_new_tokens = min(parameters.get("max_new_tokens") or self.server.max_tokens, self.server.max_tokens)
+        words = [f"{word} " for word in (self.server.reply.split(" ") * max_new_tokens)[:max_new_tokens]]
+
+        start = time.perf_counter()
+        self.server.load_adapter(adapter_id)
+        time.sleep(self.server.prefill_time)
+        if self.path == "/generate":
+            time.sleep(self.server.token_time * len(words))
+            self.server.record(start, len(words))
+            self.send_body(json.dumps({"generated_text": "".join(words)}).encode(), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for index, word in enumerate(words):
+            event = {"token": self.token(index, word), "generated_text": None, "details": None}
+            if index == len(words) - 1:
+                event["generated_text"] = "".join(words)
+            self.send_chunk(f"data:{json.dumps(event)}\n\n".encode())
+            time.sleep(self.server.token_time)
+        self.send_chunk(b"")
+        self.server.record(start, len(words))
+
+class StubLoraxServer(ThreadingHTTPServer):
+    """A stand-in for a LoRAX server, for trying the load generator and dashboard offline.
+
+    Adapters are "loaded" into `adapter_slots` slots that are evicted least recently
+    used first. A request for an adapter that is not loaded waits `adapter_load_time`;
+    requests that arrive while it loads wait for the same load. Each request then pays
+    `prefill_time` and `token_time` per generated token. The base model ("") is always
+    loaded. Requests naming one of `failing_adapters` get a 400.
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, adapter_slots: int = 4, adapter_load_time: float = 1.0, prefill_time: float = 0.05,
+                 token_time: float = 0.02, max_tokens: int = 64, reply: str = "LoRA adapters share one base model.",
+                 failing_adapters=()):
+        super().__init__(("127.0.0.1", port), StubLoraxHandler)
+        self.adapter_slots = adapter_slots
+        self.adapter_load_time = adapter_load_time
+        self.prefill_time = prefill_time
+        self.token_time = token_time
+        self.max_tokens = max_tokens
+        self.reply = reply
+        self.failing_adapters = set(failing_adapters)
+        self.lock = threading.Lock()
+        self.loaded: "OrderedDict[str, threading.Event]" = OrderedDict()
+        self.counters = {"requests": 0, "tokens": 0, "adapter_loads": 0, "duration": 0.0}
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def load_adapter(self, adapter_id: str):
+        if not adapter_id:
+            return
+        loader = False
+        with self.lock:
+            loaded = self.loaded.get(adapter_id)
+            if loaded is not None:
+                self.loaded.move_to_end(adapter_id)
+            else:
+                loaded = self.loaded[adapter_id] = threading.Event()
+                self.counters["adapter_loads"] += 1
+                while len(self.loaded) > self.adapter_slots:
+                    self.loaded.popitem(last=False)
+                loader = True
+        if loader:
+            time.sleep(self.adapter_load_time)
+            loaded.set()
+        else:
+            loaded.wait()
+
+    def record(self, start: float, tokens: int):
+        with self.lock:
+            self.counters["requests"] += 1
+            self.counters["tokens"] += tokens
+            self.counters["duration"] += time.perf_counter() - start
+
+    def metrics_text(self) -> str:
+        with self.lock:
+            counters = dict(self.counters)
+            loaded = len(self.loaded)
+        return "\n".join([
+            "# TYPE lorax_request_count counter",
+            f"lorax_request_count {counters['requests']}",
+            "# TYPE lorax_request_success counter",
+            f"lorax_request_success {counters['requests']}",
+            "# TYPE lorax_request_generated_tokens histogram",
+            f"lorax_request_generated_tokens_sum {counters['tokens']}",
+            f"lorax_request_generated_tokens_count {counters['requests']}",
+            "# TYPE lorax_request_duration summary",
+            f"lorax_request_duration_sum {counters['duration']}",
+            f"lorax_request_duration_count {counters['requests']}",
+            "# TYPE lorax_stub_adapter_loads counter",
+            f"lorax_stub_adapter_loads {counters['adapter_loads']}",
+            "# TYPE lorax_stub_loaded_adapters gauge",
+            f"lorax_stub_loaded_adapters {loaded}",
+            "",
+        ])
+
+    def start(self) -> "StubLoraxServer":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve a stub LoRAX endpoint with simulated adapter loading.")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--adapter-slots", type=int, default=4)
+    parser.add_argument("--adapter-load-time", type=float, default=1.0)
+    parser.add_argument("--token-time", type=float, default=0.02)
+    args = parser.parse_args()
+    server = StubLoraxServer(port=args.port, adapter_slots=args.adapter_slots, adapter_load_time=args.adapter_load_time,
+                             token_time=args.token_time)
+    print(f"Stub LoRAX server listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import httpx
+
+from background_loop import BackgroundLoop
+
+class LoraxError(Exception):
+    def __init__(self, message: str, error_type: Optional[str] = None, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.status_code = status_code
+
+def build_parameters(adapter_id: Optional[str] = None, adapter_source: Optional[str] = None, api_token: Optional[str] = None,
+                     max_new_tokens: Optional[int] = None, temperature: Optional[float] = None, top_k: Optional[int] = None,
+                     top_p: Optional[float] = None, typical_p: Optional[float] = None, stop_sequences: Optional[List[str]] = None,
+                     seed: Optional[int] = None, details: bool = False, **extra) -> Dict[str, Any]:
+    """Turn the playground's generation kwargs into LoRAX request parameters.
+
+    Takes the same keyword names as lorax.Client.generate_stream. LoRAX rejects a
+    temperature of 0 and top_p/typical_p outside (0, 1), so those slider ends mean
+    "off" and are left out instead of failing the request.
+    """
+    parameters = {"details": details, "stop": list(stop_sequences or [])}
+    if adapter_id:
+        parameters["adapter_id"] = adapter_id
+    if adapter_source:
+        parameters["adapter_source"] = adapter_source
+    if api_token:
+        parameters["api_token"] = api_token
+    if max_new_tokens is not None:
+        parameters["max_new_tokens"] = max_new_tokens
+    if temperature:
+        parameters["temperature"] = temperature
+    if top_k:
+        parameters["top_k"] = top_k
+    if top_p is not None and 0 < top_p < 1:
+        parameters["top_p"] = top_p
+    if typical_p is not None and 0 < typical_p < 1:
+        parameters["typical_p"] = typical_p
+    if seed is not None:
+        parameters["seed"] = seed
+    parameters.update({name: value for name, value in extra.items() if value is not None})
+    return parameters
+
+class LoraxClient:
+    """Async client for one LoRAX endpoint over a pooled httpx connection.
+
+    Use for_endpoint() to share one client, and so one keep-alive pool, per endpoint
+    across Streamlit reruns and sessions. The connections belong to the background
+    loop, so the coroutines here must run on it (BackgroundLoop.run_sync/iterate).
+    """
+    _clients: Dict[str, "LoraxClient"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, endpoint_url: str, max_connections: int = 64, timeout: float = 300.0):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.http_client = None
+        self.background_loop = BackgroundLoop.get()
+        self.background_loop.on_shutdown(self.close)
+
+    @classmethod
+    def for_endpoint(cls, endpoint_url: str) -> "LoraxClient":
+        """Return the shared client for an endpoint, creating it on first use."""
+        key = endpoint_url.rstrip("/")
+        with cls._lock:
+            if key not in cls._clients:
+                cls._clients[key] = cls(key)
+            return cls._clients[key]
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(
+                base_url=self.endpoint_url,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                # Generations can run long, but a dead endpoint should fail fast
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+            )
+        return self.http_client
+
+    async def close(self):
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+
+    @staticmethod
+    def error_from(status_code: int, body: bytes) -> LoraxError:
+        try:
+            payload = json.loads(body)
+            return LoraxError(payload.get("error", str(payload)), payload.get("error_type"), status_code)
+        except (ValueError, AttributeError):
+            return LoraxError(body.decode(errors="replace") or f"HTTP {status_code}", status_code=status_code)
+
+    async def metrics_text(self) -> str:
+        """The server's Prometheus metrics, in the text exposition format."""
+        response = await self.get_http_client().get("/metrics", timeout=10.0)
+        if response.status_code != 200:
+            raise self.error_from(response.status_code, response.content)
+        return response.text
+
+    async def generate(self, prompt: str, **kwargs) -> Dict[str, Any]:
+        """Generate a whole response; returns LoRAX's JSON (generated_text, details)."""
+        payload = {"inputs": prompt, "parameters": build_parameters(**kwargs)}
+        response = await self.get_http_client().post("/generate", json=payload)
+        if response.status_code != 200:
+            raise self.error_from(response.status_code, response.content)
+        return response.json()
+
+    async def generate_stream(self, prompt: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a response as LoRAX's server-sent events.
+
+        Each event is a dict with a "token" ({"id", "text", "logprob", "special"}),
+        and the last one also carries "generated_text" (and "details" if requested).
+        """
+        payload = {"inputs": prompt, "parameters": build_parameters(**kwargs)}
+        async with self.get_http_client().stream("POST", "/generate_stream", json=payload) as response:
+            if response.status_code != 200:
+                raise self.error_from(response.status_code, await response.aread())
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if "error" in event:
+                    raise LoraxError(event["error"], event.get("error_type"))
+                yield event
+
+async def generate_response(client: LoraxClient, prompt: str, **kwargs) -> AsyncIterator[str]:
+    """Stream the text of a response, without special tokens and up to the ChatML end token."""
+    async for response in client.generate_stream(prompt, **kwargs):
+        if response["token"]["special"]:
+            continue  # Skip special tokens
+        
+        token_text = response["token"]["text"]
+        if "<|im_end|>" in token_text:
+            # Yield any text before the end token, then stop
+            yield token_text.split("<|im_end|>")[0]
+            break
+        else:
+            yield token_text
+
+async def fan_out(streams: Sequence[AsyncIterator[Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """Run several streams at once and yield their items as they arrive.
+
+    Yields {"index": i, "item": item} for each item of streams[i], then
+    {"index": i, "done": True, "error": message or None} when that stream ends. A
+    failing stream does not stop the others. Sending the requests together is what
+    lets LoRAX batch them, across adapters too.
+    """
+    events = asyncio.Queue()
+
+    async def pump(index: int, stream: AsyncIterator[Any]):
+        error = None
+        try:
+            async for item in stream:
+                await events.put({"index": index, "item": item})
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        await events.put({"index": index, "done": True, "error": error})
+
+    tasks = [asyncio.create_task(pump(index, stream)) for index, stream in enumerate(streams)]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            event = await events.get()
+            if event.get("done"):
+                remaining -= 1
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
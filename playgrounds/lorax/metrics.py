@@ -0,0 +1,291 @@
+import asyncio
+import math
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from background_loop import BackgroundLoop
+from lorax_client import LoraxClient
+
+# name{labels} value [timestamp]
+SAMPLE_PATTERN = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)(?:\s+\S+)?$")
+LABEL_PATTERN = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"\s*,?')
+LABEL_ESCAPES = {"\\\\": "\\", '\\"': '"', "\\n": "\n"}
+HISTOGRAM_SUFFIXES = ("_bucket", "_sum", "_count")
+
+class Sample(NamedTuple):
+    name: str
+    labels: Dict[str, str]
+    value: float
+
+class MetricFamily:
+    """One metric from the Prometheus text format, with all of its samples.
+
+    type is "counter", "gauge", "histogram", "summary" or "untyped". A histogram's
+    samples are its <name>_bucket (with an "le" label), <name>_sum and <name>_count.
+    """
+
+    def __init__(self, name: str, type: str = "untyped", help: str = ""):
+        self.name = name
+        self.type = type
+        self.help = help
+        self.samples: List[Sample] = []
+
+def parse_labels(text: str) -> Dict[str, str]:
+    return {
+        name: re.sub(r'\\[\\"n]', lambda match: LABEL_ESCAPES[match.group(0)], value)
+        for name, value in LABEL_PATTERN.findall(text or "")
+    }
+
+def parse_value(text: str) -> float:
+    # float() already takes "NaN", "+Inf" and "-Inf"
+    return float(text)
+
+def parse_prometheus(text: str) -> Dict[str, MetricFamily]:
+    """Parse the Prometheus text exposition format into metric families by name.
+
+    Samples without a TYPE line become untyped families of their own; malformed
+    lines are skipped rather than failing the whole scrape.
+    """
+    families: Dict[str, MetricFamily] = {}
+
+    def family_for(sample_name: str) -> MetricFamily:
+        if sample_name in families:
+            return families[sample_name]
+        for suffix in HISTOGRAM_SUFFIXES:
+            base = sample_name[:-len(suffix)]
+            if sample_name.endswith(suffix) and base in families and families[base].type in ("histogram", "summary"):
+                return families[base]
+        families[sample_name] = MetricFamily(sample_name)
+        return families[sample_name]
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            parts = line.split(None, 3)
+            if len(parts) >= 3 and parts[1] in ("TYPE", "HELP"):
+                family = families.setdefault(parts[2], MetricFamily(parts[2]))
+                if parts[1] == "TYPE" and len(parts) == 4:
+                    family.type = parts[3].strip()
+                elif parts[1] == "HELP":
+                    family.help = parts[3] if len(parts) == 4 else ""
+            continue
+        match = SAMPLE_PATTERN.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        try:
+            sample = Sample(name, parse_labels(labels), parse_value(value))
+        except ValueError:
+            continue
+        family_for(name).samples.append(sample)
+    return families
+
+def histogram_quantile(q: float, buckets: List[Tuple[float, float]]) -> Optional[float]:
+    """Estimate a quantile from cumulative (upper bound, count) buckets.
+
+    Interpolates linearly inside the bucket the quantile falls in, as Prometheus'
+    histogram_quantile() does. None when the buckets hold no observations.
+    """
+    buckets = sorted(buckets)
+    if not buckets or buckets[-1][1] <= 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower_bound, lower_count = 0.0, 0.0
+    for upper_bound, count in buckets:
+        if count >= rank:
+            if math.isinf(upper_bound):
+                # Past the last finite bucket; its bound is the best estimate there is
+                return lower_bound
+            if count == lower_count:
+                return upper_bound
+            return lower_bound + (upper_bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = upper_bound, count
+    return buckets[-1][0]
+
+class Snapshot:
+    """The parsed metrics of one scrape, with the time it was taken."""
+
+    def __init__(self, families: Dict[str, MetricFamily], timestamp: float):
+        self.families = families
+        self.timestamp = timestamp
+        self.samples: Dict[str, List[Sample]] = {}
+        for family in families.values():
+            for sample in family.samples:
+                self.samples.setdefault(sample.name, []).append(sample)
+
+    def matching(self, sample_name: str, labels: Dict[str, str]) -> List[Sample]:
+        return [sample for sample in self.samples.get(sample_name, [])
+                if all(sample.labels.get(name) == value for name, value in labels.items())]
+
+    def value(self, sample_name: str, **labels) -> Optional[float]:
+        """Sum of the samples with this name whose labels include `labels`; None if there are none."""
+        samples = self.matching(sample_name, labels)
+        return sum(sample.value for sample in samples) if samples else None
+
+    def buckets(self, name: str, **labels) -> Dict[float, float]:
+        """A histogram's cumulative counts by upper bound, summed over any other labels."""
+        buckets: Dict[float, float] = {}
+        for sample in self.matching(f"{name}_bucket", labels):
+            bound = parse_value(sample.labels.get("le", "+Inf"))
+            buckets[bound] = buckets.get(bound, 0.0) + sample.value
+        return buckets
+
+def counter_rate(old: Snapshot, new: Snapshot, sample_name: str, **labels) -> Optional[float]:
+    """Per-second increase of a counter between two snapshots, allowing for server restarts."""
+    before, after = old.value(sample_name, **labels), new.value(sample_name, **labels)
+    elapsed = new.timestamp - old.timestamp
+    if after is None or elapsed <= 0:
+        return None
+    # A counter that went down was reset, so everything it holds now is new
+    increase = after - before if before is not None and after >= before else after
+    return increase / elapsed
+
+def quantile(old: Snapshot, new: Snapshot, name: str, q: float, **labels) -> Optional[float]:
+    """The q-quantile of a histogram's observations between two snapshots.
+
+    Summaries carry precomputed quantiles over the server's own window, so for those
+    the newest value of the closest quantile is returned instead.
+    """
+    family = new.families.get(name)
+    if family is not None and family.type == "summary":
+        candidates = [sample for sample in new.matching(name, labels) if "quantile" in sample.labels]
+        if not candidates:
+            return None
+        closest = min(candidates, key=lambda sample: abs(float(sample.labels["quantile"]) - q))
+        return None if math.isnan(closest.value) else closest.value
+    after = new.buckets(name, **labels)
+    before = old.buckets(name, **labels)
+    if not after:
+        return None
+    total_before, total_after = max(before.values(), default=0.0), max(after.values())
+    # After a restart the older counts no longer apply
+    if total_after < total_before:
+        before = {}
+    return histogram_quantile(q, [(bound, count - before.get(bound, 0.0)) for bound, count in after.items()])
+
+def mean(old: Snapshot, new: Snapshot, name: str, **labels) -> Optional[float]:
+    """Mean of a histogram's or summary's observations between two snapshots."""
+    sum_rate = counter_rate(old, new, f"{name}_sum", **labels)
+    count_rate = counter_rate(old, new, f"{name}_count", **labels)
+    if not count_rate:
+        return None
+    return sum_rate / count_rate
+
+def lorax_summary(old: Snapshot, new: Snapshot) -> Dict[str, Optional[float]]:
+    """The numbers worth watching on a LoRAX server, over the span between two snapshots.
+
+    Durations are in seconds. Tokens per second counts the tokens of requests that
+    finished in the span, which is how LoRAX reports them.
+    """
+    return {
+        "requests_per_second": counter_rate(old, new, "lorax_request_count"),
+        "successes_per_second": counter_rate(old, new, "lorax_request_success"),
+        "tokens_per_second": counter_rate(old, new, "lorax_request_generated_tokens_sum"),
+        "prefills_per_second": counter_rate(old, new, "lorax_batch_inference_success", method="prefill"),
+        "decodes_per_second": counter_rate(old, new, "lorax_batch_inference_success", method="decode"),
+        "queue_p50": quantile(old, new, "lorax_request_queue_duration", 0.5),
+        "queue_p95": quantile(old, new, "lorax_request_queue_duration", 0.95),
+        "prefill_p50": quantile(old, new, "lorax_batch_inference_duration", 0.5, method="prefill"),
+        "prefill_p95": quantile(old, new, "lorax_batch_inference_duration", 0.95, method="prefill"),
+        "decode_p50": quantile(old, new, "lorax_batch_inference_duration", 0.5, method="decode"),
+        "decode_p95": quantile(old, new, "lorax_batch_inference_duration", 0.95, method="decode"),
+        "time_per_token_p50": quantile(old, new, "lorax_request_mean_time_per_token_duration", 0.5),
+        "request_p95": quantile(old, new, "lorax_request_duration", 0.95),
+        "mean_batch_size": mean(old, new, "lorax_batch_next_size"),
+        "batch_size": new.value("lorax_batch_current_size"),
+        "queue_size": new.value("lorax_queue_size"),
+    }
+
+class MetricsPoller:
+    """Scrapes an endpoint's /metrics at a fixed interval on the background loop.
+
+    Keeps the last `history` snapshots so rates, quantiles and their trends can be
+    read at any time without a request from the Streamlit script. Use for_endpoint()
+    to share one poller per endpoint across reruns and sessions. A poller that nobody
+    has asked for in `idle_timeout` seconds stops, so endpoints typed into the sidebar
+    and then edited away are not scraped forever.
+    """
+    _pollers: Dict[str, "MetricsPoller"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, client: LoraxClient, interval: float = 5.0, history: int = 360, idle_timeout: float = 60.0):
+        self.client = client
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.last_used = time.monotonic()
+        self.history = deque(maxlen=history)
+        self.last_error: Optional[str] = None
+        self.background_loop = BackgroundLoop.get()
+        self.task = None
+
+    @classmethod
+    def for_endpoint(cls, endpoint_url: str, interval: float = 5.0) -> "MetricsPoller":
+        """Return the running poller for an endpoint, starting it on first use or after it went idle."""
+        client = LoraxClient.for_endpoint(endpoint_url)
+        with cls._lock:
+            poller = cls._pollers.get(client.endpoint_url)
+            if poller is None:
+                poller = cls._pollers[client.endpoint_url] = cls(client, interval)
+                poller.start()
+            poller.interval = interval
+            poller.last_used = time.monotonic()
+            return poller
+
+    def start(self):
+        # Not waited for: the poll loop takes _lock, which the caller holds
+        self.task = asyncio.run_coroutine_threadsafe(self.poll_forever(), self.background_loop.loop)
+        self.background_loop.on_shutdown(self.stop)
+
+    def expire_if_idle(self) -> bool:
+        with self._lock:
+            if time.monotonic() - self.last_used <= self.idle_timeout:
+                return False
+            if self._pollers.get(self.client.endpoint_url) is self:
+                del self._pollers[self.client.endpoint_url]
+            self.task = None
+            return True
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def poll(self):
+        text = await self.client.metrics_text()
+        families = await asyncio.to_thread(parse_prometheus, text)
+        self.history.append(Snapshot(families, time.time()))
+        self.last_error = None
+
+    async def poll_forever(self):
+        while not self.expire_if_idle():
+            try:
+                await self.poll()
+            except Exception as e:
+                # Keep polling; the endpoint may just not be up yet. The metrics panel shows the error
+                self.last_error = str(e) or type(e).__name__
+            await asyncio.sleep(self.interval)
+
+    @property
+    def latest(self) -> Optional[Snapshot]:
+        return self.history[-1] if self.history else None
+
+    def summary(self, window: float = 60.0) -> Optional[Dict[str, Optional[float]]]:
+        """lorax_summary() over roughly the last `window` seconds; None until two scrapes exist."""
+        snapshots = list(self.history)
+        if len(snapshots) < 2:
+            return None
+        newest = snapshots[-1]
+        oldest = next((snapshot for snapshot in snapshots if newest.timestamp - snapshot.timestamp <= window), snapshots[-2])
+        if oldest is newest:
+            oldest = snapshots[-2]
+        return lorax_summary(oldest, newest)
+
+    def trends(self) -> List[Dict[str, Optional[float]]]:
+        """lorax_summary() between each pair of consecutive scrapes, oldest first, with its "time"."""
+        snapshots = list(self.history)
+        return [dict(lorax_summary(old, new), time=new.timestamp) for old, new in zip(snapshots, snapshots[1:])]
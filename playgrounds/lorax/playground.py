@@ -1,42 +1,82 @@
 import streamlit as st
-from lorax import Client
 import os
 from PIL import Image
-import requests
+import pandas as pd
+import sys
+
+# Code shared by the playgrounds lives next to them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+from background_loop import BackgroundLoop
+from lorax_client import LoraxClient, fan_out, generate_response
+from metrics import MetricsPoller
+from stream_renderer import StreamRenderer
 
 def load_system_prompt(file_path):
     with open(file_path, 'r') as file:
         return file.read()
 
-def generate_response(client, prompt, **kwargs):
-    for response in client.generate_stream(prompt, **kwargs):
-        if response.token.special:
-            continue  # Skip special tokens
-        
-        token_text = response.token.text
-        if "<|im_end|>" in token_text:
-            # Yield any text before the end token, then stop
-            yield token_text.split("<|im_end|>")[0]
-            break
+def format_value(value, unit=""):
+    if value is None:
+        return "–"
+    if unit == "s":
+        return f"{value * 1000:.0f} ms" if value < 1 else f"{value:.2f} s"
+    return f"{value:.1f}{unit}"
+
+@st.fragment(run_every=5)
+def show_metrics(endpoint_url, poll_interval, window):
+    """Live server metrics from the background poller; reruns on its own without the chat."""
+    poller = MetricsPoller.for_endpoint(endpoint_url, poll_interval)
+    summary = poller.summary(window)
+    if summary is None:
+        if poller.last_error:
+            st.warning(f"Unable to fetch metrics: {poller.last_error}")
         else:
-            yield token_text
-
-def fetch_metrics(endpoint_url):
-    try:
-        response = requests.get(f"{endpoint_url}/metrics")
-        if response.status_code == 200:
-            metrics = response.text
-            decode_success = 0
-            prefill_success = 0
-            for line in metrics.split('\n'):
-                if line.startswith('lorax_batch_inference_success{method="decode"}'):
-                    decode_success = int(line.split()[-1])
-                elif line.startswith('lorax_batch_inference_success{method="prefill"}'):
-                    prefill_success = int(line.split()[-1])
-            return decode_success, prefill_success
-    except:
-        pass
-    return None, None
+            st.info("Collecting metrics...")
+        return
+    if poller.last_error:
+        st.warning(f"Latest metrics fetch failed: {poller.last_error}")
+
+    columns = st.columns(4)
+    columns[0].metric("Requests/s", format_value(summary["requests_per_second"]))
+    columns[1].metric("Tokens/s", format_value(summary["tokens_per_second"]))
+    columns[2].metric("Batch Size", format_value(summary["batch_size"]))
+    columns[3].metric("Queue Size", format_value(summary["queue_size"]))
+    columns = st.columns(4)
+    columns[0].metric("Queue p50 / p95", f"{format_value(summary['queue_p50'], 's')} / {format_value(summary['queue_p95'], 's')}")
+    columns[1].metric("Prefill p50 / p95", f"{format_value(summary['prefill_p50'], 's')} / {format_value(summary['prefill_p95'], 's')}")
+    columns[2].metric("Decode p50 / p95", f"{format_value(summary['decode_p50'], 's')} / {format_value(summary['decode_p95'], 's')}")
+    columns[3].metric("Time per Token p50", format_value(summary["time_per_token_p50"], "s"))
+
+    trends = pd.DataFrame(poller.trends(), dtype=float)
+    if not trends.empty:
+        trends["time"] = pd.to_datetime(trends["time"], unit="s")
+        trends = trends.set_index("time")
+        st.caption("Throughput")
+        st.line_chart(trends[["requests_per_second", "tokens_per_second", "decodes_per_second"]])
+        st.caption("Latency (seconds)")
+        st.line_chart(trends[["queue_p95", "prefill_p95", "decode_p95"]])
+
+def stream_fan_out(client, prompts, kwargs_list, labels):
+    """Send several generations at once and stream each into its own column."""
+    columns = st.columns(min(len(labels), 3))
+    renderers, errors = [], []
+    for index, label in enumerate(labels):
+        with columns[index % len(columns)]:
+            st.caption(label)
+            renderers.append(StreamRenderer(st.empty()))
+            errors.append(st.empty())
+
+    streams = [generate_response(client, prompt, **kwargs) for prompt, kwargs in zip(prompts, kwargs_list)]
+    for event in BackgroundLoop.get().iterate(fan_out(streams)):
+        index = event["index"]
+        if not event.get("done"):
+            renderers[index].write(event["item"])
+            continue
+        renderers[index].finalize()
+        if event["error"]:
+            errors[index].error(f"Generation failed: {event['error']}")
+    return [renderer.finalize() for renderer in renderers]
 
 def main():
     st.set_page_config(page_title="Lorax Chat Demo", page_icon="🦁", layout="wide")
@@ -55,6 +95,8 @@ def main():
     endpoint_url = st.sidebar.text_input("Endpoint URL", value="http://127.0.0.1:8080")
     adapter_source = st.sidebar.text_input("Adapter Source", value="hub")
     adapter_id = st.sidebar.text_input("Adapter ID", value="")
+    compare_adapters = st.sidebar.text_area("Compare Adapters", value="", help="One adapter ID per line. Each message is sent to all of them at once and the answers are shown side by side.")
+    compare_adapter_ids = [line.strip() for line in compare_adapters.splitlines() if line.strip()]
     api_token = st.sidebar.text_input("API Token", value="", type="password")
     st.sidebar.divider()
     system_prompt = st.sidebar.text_area("System Prompt", value="You are a helpful AI assistant", height=3)
@@ -65,6 +107,8 @@ def main():
         top_p = st.sidebar.slider("Top-p", 0.0, 1.0, 0.95)
         top_k = st.sidebar.slider("Top-k", 1, 10, 10)
         typical_p = st.sidebar.slider("Typical-p", 0.0, 1.0, 0.95)
+        metrics_interval = st.sidebar.number_input("Metrics Poll Interval (s)", value=5, min_value=1, max_value=60)
+        metrics_window = st.sidebar.number_input("Metrics Window (s)", value=60, min_value=10, max_value=1800)
 
     # Add template selection dropdown
     template_options = {
@@ -82,6 +126,27 @@ def main():
 
     selected_template = st.sidebar.selectbox("Select Template", list(template_options.keys()))
 
+    def generation_kwargs(adapter_id):
+        kwargs = {
+            "adapter_source": adapter_source,
+            "api_token": api_token,
+            "max_new_tokens": max_new_tokens,
+            "temperature": temperature,
+            "top_k": top_k,
+            "top_p": top_p,
+            "typical_p": typical_p,
+            "stop_sequences": ["<|im_end|>"]
+        }
+        # Only add adapter_id if it's provided
+        if adapter_id:
+            kwargs["adapter_id"] = adapter_id
+        return kwargs
+
+    with st.expander("Batch Prompts"):
+        batch_text = st.text_area("Prompts", value="", help="One prompt per line. All of them are sent at once with the current adapter.")
+        batch_prompts = [line.strip() for line in batch_text.splitlines() if line.strip()]
+        run_batch = st.button("Run Batch", disabled=not batch_prompts)
+
     # Initialize session state for chat history (only keeping the last message)
     if "last_message" not in st.session_state:
         st.session_state.last_message = None
@@ -98,47 +163,40 @@ def main():
 
         # Generate response
         with st.chat_message("assistant"):
-            client = Client(endpoint_url)
+            client = LoraxClient.for_endpoint(endpoint_url)
             template = template_options[selected_template]
             full_prompt = template.format(ctx=prompt, system=system_prompt)
-            response_container = st.empty()
-            full_response = ""
-
-            # Prepare kwargs for generate_response
-            kwargs = {
-                "adapter_source": adapter_source,
-                "api_token": api_token,
-                "max_new_tokens": max_new_tokens,
-                "temperature": temperature,
-                "top_k": top_k,
-                "top_p": top_p,
-                "typical_p": typical_p,
-                "stop_sequences": ["<|im_end|>"]
-            }
-
-            # Only add adapter_id if it's provided
-            if adapter_id:
-                kwargs["adapter_id"] = adapter_id
-
-            for response_chunk in generate_response(client, full_prompt, **kwargs):
-                full_response += response_chunk
-                response_container.markdown(full_response + "▌")
-            response_container.markdown(full_response)
+
+            if compare_adapter_ids:
+                # Every adapter gets the prompt at once so LoRAX can batch them together
+                responses = stream_fan_out(
+                    client,
+                    [full_prompt] * len(compare_adapter_ids),
+                    [generation_kwargs(adapter_id) for adapter_id in compare_adapter_ids],
+                    compare_adapter_ids,
+                )
+                full_response = "\n\n".join(f"**{adapter_id}**\n\n{response}" for adapter_id, response in zip(compare_adapter_ids, responses))
+            else:
+                with StreamRenderer(st.empty()) as renderer:
+                    for response_chunk in BackgroundLoop.get().iterate(generate_response(client, full_prompt, **generation_kwargs(adapter_id))):
+                        renderer.write(response_chunk)
+                full_response = renderer.text
 
         # Update the last message in session state
         st.session_state.last_message = {"role": "assistant", "content": full_response}
 
-    # Fetch and display metrics
-    decode_success, prefill_success = fetch_metrics(endpoint_url)
-    if decode_success is not None and prefill_success is not None:
-        metrics_info = f"""
-        Inference Metrics:
-        - Decode Success: {decode_success}
-        - Prefill Success: {prefill_success}
-        """
-        st.sidebar.info(metrics_info)
-    else:
-        st.sidebar.warning("Unable to fetch metrics. Please check the endpoint URL.")
+    if run_batch and batch_prompts:
+        client = LoraxClient.for_endpoint(endpoint_url)
+        template = template_options[selected_template]
+        stream_fan_out(
+            client,
+            [template.format(ctx=batch_prompt, system=system_prompt) for batch_prompt in batch_prompts],
+            [generation_kwargs(adapter_id)] * len(batch_prompts),
+            batch_prompts,
+        )
+
+    with st.expander("Server Metrics"):
+        show_metrics(endpoint_url, metrics_interval, metrics_window)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from run_load_test import run, summarize
+from stub_lorax import StubLoraxServer
+
+ADAPTER_LOAD_TIME = 0.1
+
+@pytest.fixture
+def stub_server():
+    server = StubLoraxServer(adapter_slots=2, adapter_load_time=ADAPTER_LOAD_TIME, prefill_time=0.005, token_time=0.001,
+                             max_tokens=4).start()
+    yield server
+    server.stop()
+
+def load_test_args(**overrides):
+    args = dict(adapters="a,b,c,d,base", adapter_source="hub", prompts=None, concurrency=1, rate=None, requests=40,
+                duration=None, max_in_flight=8, max_new_tokens=4, temperature=0.0, reload_factor=3.0, seed=0)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+def test_stub_run_classifies_cold_warm_and_reloads(stub_server):
+    summary = asyncio.run(run(load_test_args(), stub_server.url))
+    adapters = summary["adapters"]
+
+    assert summary["overall"]["requests"] == 40
+    assert summary["overall"]["errors"] == 0
+    # The base model is never loaded, so it is never cold and has no load time
+    base = adapters["base"]
+    assert base["cold_requests"] == 0 and base["reloads"] == 0
+    assert base["adapter_load_s"] is None
+    # Four adapters in two slots: each is cold once, and evictions show up as reloads
+    assert summary["overall"]["reloads"] > 0
+    for name in "abcd":
+        stats = adapters[name]
+        assert stats["cold_requests"] >= 1
+        assert stats["ttft_cold_p50_s"] >= ADAPTER_LOAD_TIME
+        if stats["ttft_warm_p50_s"] is not None:
+            assert stats["ttft_warm_p50_s"] < ADAPTER_LOAD_TIME / 2
+            assert stats["adapter_load_s"] >= ADAPTER_LOAD_TIME / 2
+    assert stub_server.counters["adapter_loads"] == sum(adapters[name]["cold_requests"] + adapters[name]["reloads"] for name in "abcd")
+
+def test_adapter_load_time_is_never_negative():
+    results = [
+        {"adapter_id": "a", "cold": True, "tokens": 1, "error": None, "ttft_s": 0.010, "e2e_s": 0.010},
+        {"adapter_id": "a", "cold": False, "tokens": 1, "error": None, "ttft_s": 0.020, "e2e_s": 0.020},
+        {"adapter_id": "a", "cold": False, "tokens": 1, "error": None, "ttft_s": 0.030, "e2e_s": 0.030},
+    ]
+    stats = summarize(results, elapsed=1.0, reload_factor=3.0)["adapters"]["a"]
+    assert stats["cold_requests"] == 1
+    assert stats["adapter_load_s"] == 0.0
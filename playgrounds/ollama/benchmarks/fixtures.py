@@ -0,0 +1,48 @@
+import gzip
+import os
+import random
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Number of top-level blocks in each page; "large" is roughly a 10 MB page
+HTML_SIZES = {"small": 10, "medium": 300, "large": 12000}
+
+WORDS = ("latency throughput model token prompt adapter scrape browser cache image query tool "
+         "stream batch server client request response context budget").split()
+
+def html_page(blocks: int, seed: int = 0) -> str:
+    """A deterministic page shaped like the news and docs sites the scraper sees."""
+    rng = random.Random(seed)
+    parts = ["<!DOCTYPE html><html><head><title>Fixture</title></head><body><main>"]
+    for i in range(blocks):
+        tag = ("article", "section", "div")[i % 3]
+        paragraphs = "".join(
+            f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))}</p>"
+            for _ in range(rng.randint(1, 4))
+        )
+        links = "".join(
+            f'<li><a href="https://example.com/{i}/{j}">{rng.choice(WORDS)} {j}</a></li>'
+            for j in range(rng.randint(1, 6))
+        )
+        parts.append(f"<{tag} class=\"block\"><h2>Heading {i}</h2><div><span>{paragraphs}</span><ul>{links}</ul></div></{tag}>")
+    parts.append("</main></body></html>")
+    return "".join(parts)
+
+def fixture_path(size: str) -> str:
+    return os.path.join(FIXTURES_DIR, f"{size}.html.gz")
+
+def write_fixtures():
+    """Regenerate the saved fixtures. They are committed, so runs on any machine parse the same bytes."""
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for size, blocks in HTML_SIZES.items():
+        # mtime=0 keeps the gzip output identical from run to run
+        with gzip.GzipFile(fixture_path(size), "wb", compresslevel=9, mtime=0) as f:
+            f.write(html_page(blocks, seed=len(size)).encode("utf-8"))
+
+def html_fixture(size: str) -> str:
+    """Return the named saved HTML fixture."""
+    with gzip.open(fixture_path(size), "rt", encoding="utf-8") as f:
+        return f.read()
+
+if __name__ == "__main__":
+    write_fixtures()
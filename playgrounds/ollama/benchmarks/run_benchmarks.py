@@ -0,0 +1,293 @@
+"""Offline microbenchmarks for the tool-calling hot paths.
+
+Run from playgrounds/ollama:
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+
+Benchmarks whose dependencies are not installed are reported as skipped.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PLAYGROUND_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, PLAYGROUND_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+# Code shared by the playgrounds lives next to them
+sys.path.insert(0, os.path.join(PLAYGROUND_DIR, "..", "shared"))
+
+from fixtures import HTML_SIZES, html_fixture
+from stub_ollama import StubOllamaServer
+
+class Skip(Exception):
+    pass
+
+def summarize(samples: List[float], number: int) -> Dict[str, float]:
+    per_call = sorted(sample / number for sample in samples)
+    return {
+        "runs": len(samples),
+        "calls_per_run": number,
+        "min_s": per_call[0],
+        "median_s": statistics.median(per_call),
+        "mean_s": statistics.fmean(per_call),
+        "p95_s": per_call[min(len(per_call) - 1, int(len(per_call) * 0.95))],
+        "ops_per_s": 1 / statistics.median(per_call) if statistics.median(per_call) else float("inf"),
+    }
+
+def measure(fn: Callable[[], Any], repeat: int, number: int = 1, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, number)
+
+async def measure_async(fn: Callable[[], Any], repeat: int, number: int = 1, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, number)
+
+def require(module: str):
+    if importlib.util.find_spec(module) is None:
+        raise Skip(f"{module} is not installed")
+
+def tool_manager_with_tools(count: int):
+    from tool_manager import ToolManager
+
+    class EchoTool:
+        description = "Returns its arguments."
+        parameters = {"type": "object", "properties": {"value": {"type": "string"}}, "required": ["value"]}
+
+        async def execute(self, value: str):
+            return {"value": value}
+
+    manager = ToolManager()
+    for i in range(count):
+        manager.register_tool(f"echo_{i}", EchoTool())
+        manager.set_tool_switch(f"echo_{i}", True)
+    return manager
+
+def bench_tool_manager(repeat: int) -> Dict[str, Any]:
+    manager = tool_manager_with_tools(48)
+    results = {"get_tools": measure(manager.get_tools, repeat, number=1000)}
+
+    async def dispatch():
+        await manager.execute_tool("echo_7", value="x")
+
+    async def dispatch_batch():
+        await manager.execute_tools([{"function": {"name": f"echo_{i}", "arguments": {"value": "x"}}} for i in range(4)])
+
+    async def run():
+        results["execute_tool"] = await measure_async(dispatch, repeat, number=1000)
+        results["execute_tools_x4"] = await measure_async(dispatch_batch, repeat, number=200)
+
+    asyncio.run(run())
+    return results
+
+def bench_extraction(repeat: int) -> Dict[str, Any]:
+    from tools.html_extractor import extract_blocks, lxml_available
+
+    parsers = ["html.parser"] + (["lxml"] if lxml_available() else [])
+    results = {}
+    for size in HTML_SIZES:
+        html = html_fixture(size)
+        runs = repeat if size != "large" else max(1, repeat // 5)
+        for parser in parsers:
+            result = measure(lambda: extract_blocks(html, parser=parser), runs)
+            result["html_bytes"] = len(html)
+            results[f"{size}_{parser}"] = result
+    return results
+
+def bench_calculator(repeat: int) -> Dict[str, Any]:
+    from tools.calculator import CalculatorTool
+
+    calculator = CalculatorTool()
+    expressions = ["2 + 3 * 4", "sqrt(144) + pow(2, 10)", "(1.5 ** 8 - 7) / 3", "2 ** 1000 % 97"]
+
+    async def execute_all():
+        for expression in expressions:
+            await calculator.execute(expression)
+
+    async def sweep():
+        await calculator.execute("a * x ** 2 + b * x + c", {"a": 1.5, "b": -2, "c": 0.5, "x": list(range(1000))})
+
+    results = {}
+
+    async def run():
+        results["execute"] = await measure_async(execute_all, repeat, number=250)
+        results["execute"]["expressions_per_call"] = len(expressions)
+        results["sweep_1000"] = await measure_async(sweep, repeat, number=10)
+
+    asyncio.run(run())
+    return results
+
+def load_flux_api():
+    require("torch")
+    require("litserve")
+    require("diffusers")
+    image_gen_dir = os.path.join(PLAYGROUND_DIR, "image_gen")
+    sys.path.insert(0, image_gen_dir)
+    spec = importlib.util.spec_from_file_location("flux_server", os.path.join(image_gen_dir, "server.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    # Skip setup(), which loads the model; encoding needs nothing from it
+    return module.FluxLitAPI()
+
+def bench_encode_response(repeat: int) -> Dict[str, Any]:
+    require("PIL")
+    import random
+    from PIL import Image
+
+    api = load_flux_api()
+    # Noise is the worst case for PNG; a smooth gradient is closer to a typical render
+    rng = random.Random(0)
+    noise = Image.frombytes("RGB", (1024, 1024), bytes(rng.getrandbits(8) for _ in range(1024 * 1024 * 3)))
+    gradient = Image.linear_gradient("L").resize((1024, 1024)).convert("RGB")
+    outputs = {
+        "png_level1": {"format": "png", "compress_level": 1},
+        "png_level6": {"format": "png", "compress_level": 6},
+        "webp_q90": {"format": "webp", "quality": 90},
+        "jpeg_q90": {"format": "jpeg", "quality": 90},
+    }
+    results = {}
+    for name, image in (("noise", noise), ("gradient", gradient)):
+        for output, options in outputs.items():
+            result = measure(lambda: api.encode_result(image, options), repeat)
+            result["response_bytes"] = len(api.encode_result(image, options))
+            results[f"{name}_{output}"] = result
+    return results
+
+def bench_process_query(repeat: int) -> Dict[str, Any]:
+    require("ollama")
+    require("streamlit")
+    server = StubOllamaServer().start()
+    os.environ["OLLAMA_HOSTS"] = server.url
+    try:
+        from ollama_client import OllamaClientManager
+        from playground import process_query, DEFAULT_SYSTEM_MESSAGE
+        from tool_manager import ToolManager
+        from tools.calculator import CalculatorTool
+
+        OllamaClientManager._instance = OllamaClientManager(hosts=[server.url])
+        manager = ToolManager()
+        manager.register_tool("calculator", CalculatorTool())
+        manager.set_tool_switch("calculator", True)
+
+        async def query():
+            await process_query("What is (3 + 4) * 12 / 7?", "stub", manager, {}, DEFAULT_SYSTEM_MESSAGE, {}, [])
+
+        results = {}
+
+        async def run():
+            results["two_tool_calls"] = await measure_async(query, repeat, warmup=2)
+
+        asyncio.run(run())
+        return results
+    finally:
+        server.stop()
+
+BENCHMARKS = {
+    "tool_manager": bench_tool_manager,
+    "extract_titles_articles_links": bench_extraction,
+    "calculator": bench_calculator,
+    "encode_response": bench_encode_response,
+    "process_query": bench_process_query,
+}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=PLAYGROUND_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def run(names: List[str], repeat: int) -> Dict[str, Any]:
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "benchmarks": {},
+    }
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        try:
+            report["benchmarks"][name] = {"status": "ok", "results": BENCHMARKS[name](repeat)}
+        except Skip as e:
+            report["benchmarks"][name] = {"status": "skipped", "reason": str(e)}
+        except Exception as e:
+            traceback.print_exc()
+            report["benchmarks"][name] = {"status": "error", "reason": f"{type(e).__name__}: {e}"}
+    return report
+
+def flatten(report: Dict[str, Any]) -> Dict[str, float]:
+    """Median seconds per call for every measurement, keyed by benchmark/case."""
+    medians = {}
+    for name, benchmark in report["benchmarks"].items():
+        for case, result in benchmark.get("results", {}).items():
+            medians[f"{name}/{case}"] = result["median_s"]
+    return medians
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    old, new = flatten(baseline), flatten(current)
+    for key in sorted(old.keys() & new.keys()):
+        change = new[key] / old[key] - 1 if old[key] else 0.0
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"{key:55s} {old[key] * 1e3:10.3f} ms -> {new[key] * 1e3:10.3f} ms  {change:+7.1%} {marker}")
+        if marker:
+            regressions.append(key)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per measurement")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown that counts as a regression (0.10 = 10%%)")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    report = run(args.benchmarks or list(BENCHMARKS), args.repeat)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
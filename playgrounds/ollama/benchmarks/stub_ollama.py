@@ -0,0 +1,86 @@
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+DEFAULT_TOOL_CALLS = [
+    {'function': {'name': 'calculator', 'arguments': {'expression': '(3 + 4) * 12 / 7'}}},
+    {'function': {'name': 'calculator', 'arguments': {'expression': 'sqrt(144) + pow(2, 10)'}}},
+]
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/chat like Ollama: tool calls when tools are offered, then a canned reply."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def message(self, request: Dict) -> Dict:
+        messages = request.get('messages') or []
+        if request.get('tools') and messages and messages[-1].get('role') == 'user':
+            return {'role': 'assistant', 'content': '', 'tool_calls': self.server.tool_calls}
+        return {'role': 'assistant', 'content': self.server.reply}
+
+    def chunk(self, request: Dict, message: Dict, done: bool) -> bytes:
+        body = {
+            'model': request.get('model', 'stub'),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'message': message,
+            'done': done,
+        }
+        if done:
+            body.update({'done_reason': 'stop', 'total_duration': 0, 'eval_count': 0, 'prompt_eval_count': 0})
+        return json.dumps(body).encode('utf-8')
+
+    def send_body(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path != '/api/chat':
+            self.send_error(404)
+            return
+        message = self.message(request)
+        if not request.get('stream'):
+            self.send_body(self.chunk(request, message, True), 'application/json')
+            return
+        # Stream the reply a word at a time, tool calls arriving whole in their own chunk
+        lines = []
+        for word in message['content'].split(' '):
+            lines.append(self.chunk(request, {'role': 'assistant', 'content': word + ' '}, False))
+        if message.get('tool_calls'):
+            lines.append(self.chunk(request, {'role': 'assistant', 'content': '', 'tool_calls': message['tool_calls']}, False))
+        lines.append(self.chunk(request, {'role': 'assistant', 'content': ''}, True))
+        self.send_body(b'\n'.join(lines) + b'\n', 'application/x-ndjson')
+
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, tool_calls: List[Dict] = None, reply: str = "The results are 12.0 and 1036.0."):
+        super().__init__(('127.0.0.1', port), StubOllamaHandler)
+        self.tool_calls = tool_calls if tool_calls is not None else DEFAULT_TOOL_CALLS
+        self.reply = reply
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "StubOllamaServer":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    server = StubOllamaServer(port=11435)
+    print(f"Stub Ollama server listening on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,154 @@
+import json
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+# What the Ollama server uses when a request does not set these options
+OLLAMA_DEFAULT_NUM_CTX = 2048
+OLLAMA_DEFAULT_NUM_PREDICT = 128
+TRUNCATION_NOTE = "\n[...truncated to fit the context window]"
+
+class TokenEstimator:
+    """Counts tokens with tiktoken when it is installed, otherwise estimates them.
+
+    Llama 3's tokenizer is built on the same byte-pair scheme as tiktoken's cl100k_base,
+    so counts from it are close for the models the playground offers. The fallback
+    splits text into words and punctuation and charges one token per four characters
+    of each piece.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base", message_overhead: int = 4):
+        self.message_overhead = message_overhead
+        try:
+            import tiktoken
+            self.encoding = tiktoken.get_encoding(encoding_name)
+        except Exception:
+            self.encoding = None
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return sum(math.ceil(len(piece) / 4) for piece in re.findall(r"\w+|[^\w\s]", text))
+
+    def truncate_text(self, text: str, tokens: int) -> str:
+        """The longest prefix of text that counts as at most `tokens` tokens."""
+        if tokens <= 0 or not text:
+            return ""
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:tokens])
+        end = 0
+        for match in re.finditer(r"\w+|[^\w\s]", text):
+            tokens -= math.ceil(len(match.group()) / 4)
+            if tokens < 0:
+                break
+            end = match.end()
+        return text[:end]
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        tokens = self.message_overhead + self.count_text(message.get("content") or "")
+        if message.get("name"):
+            tokens += self.count_text(message["name"])
+        if message.get("tool_calls"):
+            tokens += self.count_text(json.dumps(message["tool_calls"], default=str))
+        return tokens
+
+class ContextWindow:
+    """Keeps the chat history sent to the model inside a token budget.
+
+    The system message and the current query are pinned by the caller and never
+    trimmed here. When the history runs over budget the oldest messages are dropped;
+    the last `keep_recent` messages are always kept. Token counts are cached per
+    message and the trimming cursor only moves forward, so each turn costs time
+    proportional to the new messages rather than the whole history. Lowering the budget
+    just trims further; raising it above the previous call's budget resets the cursor
+    once so dropped messages can come back.
+    """
+
+    def __init__(self, estimator: Optional[TokenEstimator] = None, keep_recent: int = 4):
+        self.estimator = estimator or TokenEstimator()
+        self.keep_recent = keep_recent
+        self.counts: List[int] = []
+        self.first_message = None
+        self.reset_trimming()
+
+    def reset_trimming(self):
+        self.start = 0
+        self.total = sum(self.counts)
+        self.budget = None
+
+    def sync(self, history: List[Dict[str, Any]]):
+        """Count the messages appended since the last call, starting over if the history was replaced."""
+        if len(history) < len(self.counts) or (history and self.counts and history[0] is not self.first_message):
+            self.counts = []
+            self.reset_trimming()
+        self.first_message = history[0] if history else None
+        for message in history[len(self.counts):]:
+            tokens = self.estimator.count_message(message)
+            self.counts.append(tokens)
+            self.total += tokens
+
+    def trim(self, history: List[Dict[str, Any]], budget: int):
+        # Compared with the previous call's budget, so lowering and then raising it again
+        # brings back what the lower budget dropped
+        if self.budget is None or budget > self.budget:
+            self.reset_trimming()
+        self.budget = budget
+        protected = max(len(history) - self.keep_recent, 0)
+
+        while self.total > budget and self.start < protected:
+            self.total -= self.counts[self.start]
+            self.start += 1
+
+    def fit(self, history: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """Return the most recent part of history that fits in budget tokens."""
+        self.sync(history)
+        self.trim(history, budget)
+        return history[self.start:]
+
+    def fit_tool_results(self, messages: List[Dict[str, Any]], first_result: int, options: Dict[str, Any]):
+        """Shorten the tool results at messages[first_result:] in place so the request fits num_ctx.
+
+        They are appended after the history was trimmed, so a large scrape would otherwise
+        overflow the context of the follow-up request. The tokens left after the earlier
+        messages and the reply are shared evenly; results smaller than their share keep
+        all of it and pass the rest on. A shortened result ends with TRUNCATION_NOTE.
+        """
+        results = messages[first_result:]
+        if not results:
+            return
+        budget = options.get("num_ctx", OLLAMA_DEFAULT_NUM_CTX) - options.get("num_predict", OLLAMA_DEFAULT_NUM_PREDICT)
+        budget -= sum(self.estimator.count_message(message) for message in messages[:first_result])
+        counts = [self.estimator.count_message(message) for message in results]
+        if sum(counts) <= budget:
+            return
+        remaining = max(budget, 0)
+        order = sorted(range(len(results)), key=counts.__getitem__)
+        note_tokens = self.estimator.count_text(TRUNCATION_NOTE)
+        for position, index in enumerate(order):
+            share = remaining // (len(order) - position)
+            allowed = min(counts[index], share)
+            remaining -= allowed
+            if allowed < counts[index]:
+                message = results[index]
+                content = message.get("content") or ""
+                overhead = counts[index] - self.estimator.count_text(content)
+                message["content"] = self.estimator.truncate_text(content, allowed - overhead - note_tokens) + TRUNCATION_NOTE
+
+    def history_budget(self, options: Dict[str, Any], pinned: List[Dict[str, Any]], tools: Optional[List[Dict]] = None) -> int:
+        """Tokens left for history once the reply, the pinned messages and the tool schemas are paid for."""
+        budget = options.get("num_ctx", OLLAMA_DEFAULT_NUM_CTX) - options.get("num_predict", OLLAMA_DEFAULT_NUM_PREDICT)
+        budget -= sum(self.estimator.count_message(message) for message in pinned)
+        if tools:
+            budget -= self.estimator.count_text(json.dumps(tools))
+        return max(budget, 0)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "history_messages": len(self.counts),
+            "sent_messages": len(self.counts) - self.start,
+            "dropped_messages": self.start,
+            "history_tokens": self.total,
+            "budget": self.budget or 0,
+        }
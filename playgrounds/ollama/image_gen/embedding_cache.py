@@ -0,0 +1,82 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import torch
+
+def normalize_prompt(prompt: str) -> str:
+    # Whitespace never changes the tokens the encoders see, so it should not change the key
+    return re.sub(r"\s+", " ", prompt).strip()
+
+class PromptEmbeddingCache:
+    """LRU cache of Flux text-encoder outputs keyed by normalized prompt.
+
+    Stores the T5 prompt embeddings and the pooled CLIP embeddings for one prompt per
+    entry, bounded by `max_bytes`. Entries are kept on `device` (the CPU by default, so
+    the cache does not compete with the pipeline for VRAM) and moved to the execution
+    device when a batch is assembled.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, device: str = "cpu"):
+        self.max_bytes = max_bytes
+        self.device = torch.device(device)
+        self.entries: "OrderedDict[str, Tuple[torch.Tensor, torch.Tensor]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def entry_bytes(entry: Tuple[torch.Tensor, torch.Tensor]) -> int:
+        return sum(tensor.element_size() * tensor.nelement() for tensor in entry)
+
+    def get(self, prompt: str) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+        key = normalize_prompt(prompt)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, prompt: str, prompt_embeds: torch.Tensor, pooled_prompt_embeds: torch.Tensor):
+        key = normalize_prompt(prompt)
+        entry = (prompt_embeds.detach().to(self.device), pooled_prompt_embeds.detach().to(self.device))
+        size = self.entry_bytes(entry)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entry_bytes(self.entries.pop(key))
+            self.entries[key] = entry
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= self.entry_bytes(evicted)
+
+    def encode(self, pipe, prompts: List[str], device, max_sequence_length: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Return batched (prompt_embeds, pooled_prompt_embeds) for prompts, encoding only the misses."""
+        cached = {prompt: self.get(prompt) for prompt in prompts}
+        missing = list(dict.fromkeys(prompt for prompt, entry in cached.items() if entry is None))
+        if missing:
+            prompt_embeds, pooled_prompt_embeds, _ = pipe.encode_prompt(
+                prompt=missing,
+                prompt_2=None,
+                device=device,
+                num_images_per_prompt=1,
+                max_sequence_length=max_sequence_length,
+            )
+            for i, prompt in enumerate(missing):
+                self.put(prompt, prompt_embeds[i:i + 1], pooled_prompt_embeds[i:i + 1])
+                cached[prompt] = (prompt_embeds[i:i + 1], pooled_prompt_embeds[i:i + 1])
+
+        prompt_embeds = torch.cat([cached[prompt][0].to(device) for prompt in prompts])
+        pooled_prompt_embeds = torch.cat([cached[prompt][1].to(device) for prompt in prompts])
+        return prompt_embeds, pooled_prompt_embeds
+
+    def get_stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.bytes}
@@ -0,0 +1,205 @@
+import asyncio
+import base64
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+
+class ImageJob:
+    def __init__(self, request: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.step = None
+        self.steps = None
+        self.preview = None
+        self.result = None
+        self.error = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = {
+            "job_id": self.id,
+            "status": self.status,
+            "prompt": self.request.get("prompt"),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.steps is not None:
+            job.update({"step": self.step, "steps": self.steps, "preview": self.preview})
+        if self.result is not None:
+            job.update(self.result)
+        if self.error is not None:
+            job["error"] = self.error
+        return job
+
+class ImageJobQueue:
+    """Bounded queue of image jobs that run by forwarding each one to the predict endpoint.
+
+    It lives in the API server process next to its routes. `concurrency` requests are
+    kept in flight, enough for LitServe to fill one batch while the next one waits, so
+    the GPU never idles between chat turns. Finished jobs are kept for polling, up to
+    `keep_finished` of them.
+    """
+
+    def __init__(self, predict_url: str, max_queued: int = 32, concurrency: int = 8, keep_finished: int = 256, timeout: float = 600.0):
+        self.predict_url = predict_url
+        self.max_queued = max_queued
+        self.concurrency = concurrency
+        self.keep_finished = keep_finished
+        self.timeout = timeout
+        self.jobs: "OrderedDict[str, ImageJob]" = OrderedDict()
+        self.queue = None
+        self.client = None
+        self.workers = []
+
+    def start(self):
+        # Created on first use so everything is bound to the server's running loop
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queued)
+            self.client = httpx.AsyncClient(timeout=self.timeout)
+            self.workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+
+    def submit(self, request: Dict[str, Any]) -> ImageJob:
+        """Queue a job. Raises asyncio.QueueFull when max_queued jobs are already waiting."""
+        self.start()
+        job = ImageJob(request)
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        self.evict()
+        return job
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ImageJob]:
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job.task is not None:
+            # A request already inside a GPU batch still finishes there; its result is dropped
+            job.task.cancel()
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        return job
+
+    def evict(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            if job.finished:
+                continue
+            job.status = "running"
+            job.started_at = time.time()
+            job.task = asyncio.create_task(self.run(job))
+            # wait() rather than await, so cancelling the job does not cancel the worker
+            await asyncio.wait([job.task])
+            self.evict()
+
+    async def run(self, job: ImageJob):
+        try:
+            async with self.client.stream("POST", self.predict_url, json=job.request) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    job.status, job.error = "failed", response.text
+                    return
+                content_type = response.headers.get("Content-Type", "")
+                if content_type.startswith("image/"):
+                    content = await response.aread()
+                    job.result = {
+                        "format": content_type.split("/", 1)[1],
+                        "image": base64.b64encode(content).decode("ascii"),
+                        "seed": int(response.headers["X-Seed"]),
+                        "cached": response.headers.get("X-Cache") == "hit",
+                    }
+                elif content_type.startswith("application/json"):
+                    # Image and thumbnail, already base64-encoded
+                    job.result = {
+                        **json.loads(await response.aread()),
+                        "seed": int(response.headers["X-Seed"]),
+                        "cached": response.headers.get("X-Cache") == "hit",
+                    }
+                else:
+                    # A server started with --stream sends previews before the image
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        event = json.loads(line)
+                        if event["type"] == "preview":
+                            job.step, job.steps, job.preview = event["step"], event["steps"], event["image"]
+                        elif event["type"] == "image":
+                            job.result = {key: value for key, value in event.items() if key != "type"}
+            if job.result is None:
+                job.status, job.error = "failed", "The server returned no image"
+            else:
+                job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except httpx.HTTPError as e:
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        except Exception as e:
+            # A malformed response must still end the job, or it would be polled forever
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            job.finished_at = time.time()
+
+    def get_stats(self) -> Dict[str, Any]:
+        statuses = [job.status for job in self.jobs.values()]
+        return {
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "done": statuses.count("done"),
+            "failed": statuses.count("failed"),
+            "cancelled": statuses.count("cancelled"),
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queued": self.max_queued,
+            "concurrency": self.concurrency,
+        }
+
+def add_job_routes(app: FastAPI, jobs: ImageJobQueue):
+    """Expose the queue as POST /jobs, GET /jobs, GET /jobs/{id} and DELETE /jobs/{id}."""
+
+    @app.post("/jobs")
+    async def submit_job(request: Request):
+        body = await request.json()
+        if not isinstance(body, dict) or not body.get("prompt"):
+            raise HTTPException(status_code=400, detail="prompt is required")
+        try:
+            job = jobs.submit(body)
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=429, detail=f"The image queue is full ({jobs.max_queued} jobs waiting)")
+        return {**job.to_dict(), "queue_depth": jobs.queue.qsize()}
+
+    @app.get("/jobs")
+    async def job_stats():
+        return jobs.get_stats()
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        job = jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return job.to_dict()
+
+    @app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: str):
+        job = jobs.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return job.to_dict()
@@ -0,0 +1,70 @@
+import json
+import os
+from typing import Any, Callable, Dict
+
+import torch
+from optimum.quanto import quantization_map, requantize
+from safetensors.torch import load_file, save_file
+
+WEIGHTS_NAME = "model.safetensors"
+QMAP_NAME = "quantization_map.json"
+MANIFEST_NAME = "manifest.json"
+
+def artifact_ready(artifact_dir: str, manifest: Dict[str, Any]) -> bool:
+    """True when artifact_dir holds an export made from the same source as manifest."""
+    path = os.path.join(artifact_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        return json.load(f) == manifest
+
+def deduplicated(state_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+    """safetensors refuses tensors that share memory (T5's tied embeddings), so copy the repeats."""
+    seen = set()
+    tensors = {}
+    for key, tensor in state_dict.items():
+        tensor = tensor.contiguous()
+        storage = (tensor.untyped_storage().data_ptr(), tensor.storage_offset())
+        tensors[key] = tensor.clone() if storage in seen else tensor
+        seen.add(storage)
+    return tensors
+
+def export_quantized(models: Dict[str, torch.nn.Module], artifact_dir: str, manifest: Dict[str, Any]):
+    """Save already quantized and frozen models so later starts can skip quantization.
+
+    Each model gets a subdirectory with its config, its quantized state dict in
+    safetensors format and the quanto quantization map. The manifest is written last,
+    so an interrupted export is never mistaken for a complete one.
+    """
+    manifest_path = os.path.join(artifact_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    for name, model in models.items():
+        model_dir = os.path.join(artifact_dir, name)
+        os.makedirs(model_dir, exist_ok=True)
+        if hasattr(model, "save_config"):
+            model.save_config(model_dir)  # diffusers
+        else:
+            model.config.save_pretrained(model_dir)  # transformers
+        save_file(deduplicated(model.state_dict()), os.path.join(model_dir, WEIGHTS_NAME))
+        with open(os.path.join(model_dir, QMAP_NAME), "w") as f:
+            json.dump(quantization_map(model), f)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+def load_quantized(build_model: Callable[[str], torch.nn.Module], artifact_dir: str, name: str, dtype=torch.bfloat16) -> torch.nn.Module:
+    """Rebuild a quantized model from export_quantized() output without requantizing.
+
+    build_model(model_dir) creates the model from the saved config. It runs on the meta
+    device, so no memory is spent on throwaway bf16 weights, and the safetensors file
+    is memory-mapped rather than read into memory up front.
+    """
+    model_dir = os.path.join(artifact_dir, name)
+    with torch.device("meta"):
+        model = build_model(model_dir).to(dtype)
+    state_dict = load_file(os.path.join(model_dir, WEIGHTS_NAME))
+    with open(os.path.join(model_dir, QMAP_NAME)) as f:
+        qmap = json.load(f)
+    requantize(model, state_dict, qmap, device=torch.device("cpu"))
+    model.eval()
+    return model
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from embedding_cache import normalize_prompt
+
+class ImageResultCache:
+    """Content-addressed disk cache of encoded images.
+
+    The key is a hash of everything that determines the pixels (prompt, seed, size,
+    steps, guidance) plus the output encoding, so a hit can be returned without any GPU
+    work. Only requests with an explicit seed are looked up, since an unseeded request
+    asks for a new image. The directory is bounded by `max_bytes` and evicts the least
+    recently used files first; hits refresh a file's modification time so the order
+    survives restarts.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index: "OrderedDict[str, int]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.load_index()
+
+    @staticmethod
+    def key_for(params: Dict[str, Any]) -> str:
+        params = {**params, "prompt": normalize_prompt(params["prompt"])}
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def load_index(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = self.path_for(name)
+            if os.path.isfile(path) and not name.endswith(".tmp"):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(files):
+            self.index[key] = size
+            self.bytes += size
+        self.evict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            if key not in self.index:
+                self.misses += 1
+                return None
+            try:
+                with open(self.path_for(key), "rb") as f:
+                    data = f.read()
+                os.utime(self.path_for(key))
+            except OSError:
+                # Another worker evicted it first
+                self.bytes -= self.index.pop(key)
+                self.misses += 1
+                return None
+            self.index.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.index:
+                self.bytes -= self.index.pop(key)
+            tmp_path = f"{self.path_for(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path_for(key))
+            self.index[key] = len(data)
+            self.bytes += len(data)
+            self.evict()
+
+    def evict(self):
+        while self.bytes > self.max_bytes and self.index:
+            key, size = self.index.popitem(last=False)
+            self.bytes -= size
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+
+    def get_stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.index), "bytes": self.bytes}
@@ -1,30 +1,134 @@
 from io import BytesIO
-from fastapi import Response
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, Response
+from PIL import Image
+import base64
+import json
+import queue
 import torch
+import os
+import secrets
+import sys
 import time
 import litserve as ls
 from optimum.quanto import freeze, qfloat8, quantize
 from diffusers import FlowMatchEulerDiscreteScheduler, AutoencoderKL
 from diffusers.models.transformers.transformer_flux import FluxTransformer2DModel
 from diffusers.pipelines.flux.pipeline_flux import FluxPipeline
-from transformers import CLIPTextModel, CLIPTokenizer,T5EncoderModel, T5TokenizerFast
+from transformers import CLIPTextModel, CLIPTokenizer,T5EncoderModel, T5TokenizerFast, T5Config
+import optimum.quanto
+
+from embedding_cache import PromptEmbeddingCache
+from jobs import ImageJobQueue, add_job_routes
+from result_cache import ImageResultCache
+from quantized_weights import artifact_ready, export_quantized, load_quantized
+
+# Requests arriving within BATCH_TIMEOUT seconds of each other share one pipeline call
+MAX_BATCH_SIZE = int(os.environ.get("FLUX_MAX_BATCH_SIZE", 4))
+BATCH_TIMEOUT = float(os.environ.get("FLUX_BATCH_TIMEOUT", 0.05))
+PORT = 8000
+# Jobs submitted to /jobs wait here; two batches are kept in flight so the next one is ready when the GPU frees up
+JOB_QUEUE_SIZE = int(os.environ.get("FLUX_JOB_QUEUE_SIZE", 32))
+JOB_CONCURRENCY = 2 * MAX_BATCH_SIZE
+
+DEFAULT_WIDTH = 1024
+DEFAULT_HEIGHT = 1024
+DEFAULT_STEPS = 4
+DEFAULT_GUIDANCE = 1.0
+MAX_SEQUENCE_LENGTH = 512
+
+# Limits for per-request parameters. Sizes are rounded down to a multiple of 16: the VAE
+# downsamples by 8 and the transformer packs 2x2 latent patches
+MIN_SIZE = 256
+MAX_SIZE = int(os.environ.get("FLUX_MAX_SIZE", 1024))
+SIZE_MULTIPLE = 16
+MAX_STEPS = int(os.environ.get("FLUX_MAX_STEPS", 8))
+MAX_GUIDANCE = 10.0
+
+# In streaming mode every response is newline-delimited JSON: previews while the image
+# denoises, then the final image
+STREAM = os.environ.get("FLUX_STREAM", "0") == "1"
+PREVIEW_QUALITY = 70
+# Linear map from Flux's 16 latent channels to RGB, a cheap stand-in for the VAE decoder
+LATENT_RGB_FACTORS = [
+    [-0.0346, 0.0244, 0.0681],
+    [0.0034, 0.0210, 0.0687],
+    [0.0275, -0.0668, -0.0433],
+    [-0.0174, 0.0160, 0.0617],
+    [0.0859, 0.0721, 0.0329],
+    [0.0004, 0.0383, 0.0115],
+    [0.0405, 0.0861, 0.0915],
+    [-0.0236, -0.0185, -0.0259],
+    [-0.0245, 0.0250, 0.1180],
+    [0.1008, 0.0755, -0.0421],
+    [-0.0515, 0.0201, 0.0011],
+    [0.0428, -0.0012, -0.0036],
+    [0.0817, 0.0765, 0.0749],
+    [-0.1264, -0.0522, -0.1103],
+    [-0.0280, -0.0881, -0.0499],
+    [-0.1262, -0.0982, -0.0778],
+]
+LATENT_RGB_BIAS = [-0.0329, -0.0718, -0.0851]
+
+# format name -> (PIL format, content type)
+OUTPUT_FORMATS = {"png": ("PNG", "image/png"), "webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+DEFAULT_FORMAT = os.environ.get("FLUX_OUTPUT_FORMAT", "png")
+DEFAULT_QUALITY = 90
+# Level 1 is several times faster than PIL's default of 6 for a few percent more bytes
+DEFAULT_PNG_COMPRESS_LEVEL = int(os.environ.get("FLUX_PNG_COMPRESS_LEVEL", 1))
+ENCODE_WORKERS = int(os.environ.get("FLUX_ENCODE_WORKERS", 2))
+
+EMBEDDING_CACHE_BYTES = int(os.environ.get("FLUX_EMBEDDING_CACHE_MB", 512)) * 1024 * 1024
+RESULT_CACHE_DIR = os.environ.get("FLUX_RESULT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "images"))
+RESULT_CACHE_BYTES = int(os.environ.get("FLUX_RESULT_CACHE_MB", 2048)) * 1024 * 1024
+
+MODEL_ID = "black-forest-labs/FLUX.1-schnell"
+MODEL_REVISION = "refs/pr/1"
+# Quantized transformer and T5 weights, exported on the first start and loaded on every later one
+QUANTIZED_DIR = os.environ.get("FLUX_QUANTIZED_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "quantized"))
+QUANTIZED_MANIFEST = {
+    "model": MODEL_ID,
+    "revision": MODEL_REVISION,
+    "weights": "qfloat8",
+    "torch": torch.__version__,
+    "quanto": optimum.quanto.__version__,
+}
+
+def load_transformer_and_t5():
+    """Return the qfloat8 transformer and T5 encoder, from the local export when there is one."""
+    if artifact_ready(QUANTIZED_DIR, QUANTIZED_MANIFEST):
+        start = time.perf_counter()
+        transformer = load_quantized(lambda path: FluxTransformer2DModel.from_config(FluxTransformer2DModel.load_config(path)), QUANTIZED_DIR, "transformer")
+        text_encoder_2 = load_quantized(lambda path: T5EncoderModel(T5Config.from_pretrained(path)), QUANTIZED_DIR, "text_encoder_2")
+        print(f"Loaded quantized transformer and T5 from {QUANTIZED_DIR} in {time.perf_counter() - start:.1f}s")
+        return transformer, text_encoder_2
+
+    start = time.perf_counter()
+    text_encoder_2 = T5EncoderModel.from_pretrained(MODEL_ID, subfolder="text_encoder_2", torch_dtype=torch.bfloat16, revision=MODEL_REVISION)
+    transformer = FluxTransformer2DModel.from_pretrained(MODEL_ID, subfolder="transformer", torch_dtype=torch.bfloat16, revision=MODEL_REVISION)
+
+    # quantize to 8-bit to fit on an L4
+    quantize(transformer, weights=qfloat8)
+    freeze(transformer)
+    quantize(text_encoder_2, weights=qfloat8)
+    freeze(text_encoder_2)
+    print(f"Loaded and quantized transformer and T5 in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    export_quantized({"transformer": transformer, "text_encoder_2": text_encoder_2}, QUANTIZED_DIR, QUANTIZED_MANIFEST)
+    print(f"Exported quantized weights to {QUANTIZED_DIR} in {time.perf_counter() - start:.1f}s")
+    return transformer, text_encoder_2
 
 class FluxLitAPI(ls.LitAPI):
     def setup(self, device):
+        setup_start = time.perf_counter()
         # Load the model
-        scheduler = FlowMatchEulerDiscreteScheduler.from_pretrained("black-forest-labs/FLUX.1-schnell", subfolder="scheduler", revision="refs/pr/1")
+        scheduler = FlowMatchEulerDiscreteScheduler.from_pretrained(MODEL_ID, subfolder="scheduler", revision=MODEL_REVISION)
         text_encoder = CLIPTextModel.from_pretrained("openai/clip-vit-large-patch14", torch_dtype=torch.bfloat16)
         tokenizer = CLIPTokenizer.from_pretrained("openai/clip-vit-large-patch14", torch_dtype=torch.bfloat16)
-        text_encoder_2 = T5EncoderModel.from_pretrained("black-forest-labs/FLUX.1-schnell", subfolder="text_encoder_2", torch_dtype=torch.bfloat16, revision="refs/pr/1")
-        tokenizer_2 = T5TokenizerFast.from_pretrained("black-forest-labs/FLUX.1-schnell", subfolder="tokenizer_2", torch_dtype=torch.bfloat16, revision="refs/pr/1")
-        vae = AutoencoderKL.from_pretrained("black-forest-labs/FLUX.1-schnell", subfolder="vae", torch_dtype=torch.bfloat16, revision="refs/pr/1")
-        transformer = FluxTransformer2DModel.from_pretrained("black-forest-labs/FLUX.1-schnell", subfolder="transformer", torch_dtype=torch.bfloat16, revision="refs/pr/1")
-
-        # quantize to 8-bit to fit on an L4
-        quantize(transformer, weights=qfloat8)
-        freeze(transformer)
-        quantize(text_encoder_2, weights=qfloat8)
-        freeze(text_encoder_2)
+        tokenizer_2 = T5TokenizerFast.from_pretrained(MODEL_ID, subfolder="tokenizer_2", torch_dtype=torch.bfloat16, revision=MODEL_REVISION)
+        vae = AutoencoderKL.from_pretrained(MODEL_ID, subfolder="vae", torch_dtype=torch.bfloat16, revision=MODEL_REVISION)
+        transformer, text_encoder_2 = load_transformer_and_t5()
 
         self.pipe = FluxPipeline(
             scheduler=scheduler,
@@ -38,33 +142,270 @@ class FluxLitAPI(ls.LitAPI):
         self.pipe.text_encoder_2 = text_encoder_2
         self.pipe.transformer = transformer
         self.pipe.enable_model_cpu_offload()
+        self.embedding_cache = PromptEmbeddingCache(max_bytes=EMBEDDING_CACHE_BYTES)
+        self.result_cache = ImageResultCache(RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_BYTES)
+        self.encoder = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="flux-encode")
+        # Streaming runs the pipeline here so predict can yield previews while it denoises
+        self.pipeline_runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="flux-pipeline")
+        print(f"Flux setup finished in {time.perf_counter() - setup_start:.1f}s")
     
 
     def decode_request(self, request):
         # Extract prompt from request
-        prompt = request["prompt"]
-        return prompt
-
-    def predict(self, prompt):
-        # Generate image from prompt
-        image = self.pipe(
-            prompt=prompt, 
-            width=1024,
-            height=1024,
-            num_inference_steps=4, 
-            generator=torch.Generator().manual_seed(int(time.time())),
-            guidance_scale=1.0,
-        ).images[0]
-
-        return image
-
-    def encode_response(self, image):
+        seed = request.get("seed")
+        params = {
+            "prompt": request["prompt"],
+            # Without a seed the request gets a fresh one, returned in X-Seed so it can be reproduced
+            "seed": int(seed) if seed is not None else secrets.randbelow(2**32),
+            **self.decode_image_options(request),
+            **self.decode_output_options(request),
+        }
+        # Only an explicit seed asks for a repeatable image; unseeded requests get a new one and skip the cache
+        cache_key = self.result_cache.key_for(params) if seed is not None else None
+        cached = self.result_cache.get(cache_key) if cache_key is not None else None
+        # Previews never change the final image, so they stay out of the cache key
+        preview = bool(request.get("preview", True))
+        return {**params, "preview": preview, "cache_key": cache_key, "cached": cached}
+
+    @staticmethod
+    def decode_image_options(request):
+        """Validate size, steps and guidance against the server limits."""
+        try:
+            options = {
+                "width": int(request.get("width", DEFAULT_WIDTH)) // SIZE_MULTIPLE * SIZE_MULTIPLE,
+                "height": int(request.get("height", DEFAULT_HEIGHT)) // SIZE_MULTIPLE * SIZE_MULTIPLE,
+                "num_inference_steps": int(request.get("steps", DEFAULT_STEPS)),
+                "guidance_scale": float(request.get("guidance", DEFAULT_GUIDANCE)),
+            }
+            for name in ("width", "height"):
+                if not MIN_SIZE <= options[name] <= MAX_SIZE:
+                    raise ValueError(f"{name} must be between {MIN_SIZE} and {MAX_SIZE} pixels")
+            if not 1 <= options["num_inference_steps"] <= MAX_STEPS:
+                raise ValueError(f"steps must be between 1 and {MAX_STEPS}")
+            if not 0 <= options["guidance_scale"] <= MAX_GUIDANCE:
+                raise ValueError(f"guidance must be between 0 and {MAX_GUIDANCE}")
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return options
+
+    @staticmethod
+    def decode_output_options(request):
+        """Validate how the client wants the image encoded."""
+        output_format = str(request.get("format", DEFAULT_FORMAT)).lower().replace("jpg", "jpeg")
+        if output_format not in OUTPUT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(OUTPUT_FORMATS)}")
+        options = {"format": output_format}
+        try:
+            if output_format == "png":
+                options["compress_level"] = int(request.get("compress_level", DEFAULT_PNG_COMPRESS_LEVEL))
+                if not 0 <= options["compress_level"] <= 9:
+                    raise ValueError("compress_level must be between 0 and 9")
+            else:
+                options["quality"] = int(request.get("quality", DEFAULT_QUALITY))
+                if not 1 <= options["quality"] <= 100:
+                    raise ValueError("quality must be between 1 and 100")
+            if request.get("thumbnail"):
+                options["thumbnail"] = int(request["thumbnail"])
+                if not 16 <= options["thumbnail"] <= 1024:
+                    raise ValueError("thumbnail must be between 16 and 1024 pixels")
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return options
+
+    @staticmethod
+    def encode_image(image, options):
+        pil_format, _ = OUTPUT_FORMATS[options["format"]]
         buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        return Response(content=buffered.getvalue(), headers={"Content-Type": "image/png"})
+        if options["format"] == "png":
+            image.save(buffered, format=pil_format, compress_level=options["compress_level"])
+        else:
+            image.save(buffered, format=pil_format, quality=options["quality"])
+        return buffered.getvalue()
+
+    @staticmethod
+    def content_type(options):
+        # With a thumbnail both images travel base64-encoded in one JSON body
+        return "application/json" if options.get("thumbnail") else OUTPUT_FORMATS[options["format"]][1]
+
+    def encode_result(self, image, options):
+        content = self.encode_image(image, options)
+        if options.get("thumbnail"):
+            thumbnail = image.copy()
+            thumbnail.thumbnail((options["thumbnail"], options["thumbnail"]))
+            content = json.dumps({
+                "format": options["format"],
+                "image": base64.b64encode(content).decode("ascii"),
+                "thumbnail": base64.b64encode(self.encode_image(thumbnail, options)).decode("ascii"),
+            }).encode("utf-8")
+        return content
+
+    def batch(self, inputs):
+        # Requests stay separate dicts; predict groups them by shape
+        return inputs
+
+    @staticmethod
+    def batch_key(request):
+        return (request["width"], request["height"], request["num_inference_steps"], request["guidance_scale"])
+
+    @staticmethod
+    def group_misses(requests):
+        # Cache hits pass straight through; only misses reach the GPU.
+        # Only requests with the same size, steps and guidance can share a pipeline call
+        groups = {}
+        for index, request in enumerate(requests):
+            if request["cached"] is None:
+                groups.setdefault(FluxLitAPI.batch_key(request), []).append(index)
+        return list(groups.values())
+
+    def generate(self, requests, indices, callback_on_step_end=None):
+        """Run one pipeline call for requests[indices], which share size, steps and guidance."""
+        first = requests[indices[0]]
+        # Repeated prompts reuse their text embeddings and skip both encoders
+        prompt_embeds, pooled_prompt_embeds = self.embedding_cache.encode(
+            self.pipe,
+            [requests[i]["prompt"] for i in indices],
+            device=self.pipe._execution_device,
+            max_sequence_length=MAX_SEQUENCE_LENGTH,
+        )
+        return self.pipe(
+            prompt_embeds=prompt_embeds,
+            pooled_prompt_embeds=pooled_prompt_embeds,
+            width=first["width"],
+            height=first["height"],
+            num_inference_steps=first["num_inference_steps"],
+            generator=[torch.Generator().manual_seed(requests[i]["seed"]) for i in indices],
+            guidance_scale=first["guidance_scale"],
+            callback_on_step_end=callback_on_step_end,
+        ).images
+
+    def latents_to_previews(self, latents, width, height):
+        """Approximate RGB images from packed latents, at 1/8 of the output size."""
+        latents = FluxPipeline._unpack_latents(latents, height, width, self.pipe.vae_scale_factor)
+        factors = torch.tensor(LATENT_RGB_FACTORS, dtype=latents.dtype, device=latents.device)
+        bias = torch.tensor(LATENT_RGB_BIAS, dtype=latents.dtype, device=latents.device)
+        rgb = torch.einsum("bchw,cr->bhwr", latents, factors) + bias
+        rgb = ((rgb + 1) / 2).clamp(0, 1).mul(255).to(torch.uint8).cpu().numpy()
+        return [Image.fromarray(array) for array in rgb]
+
+    def predict(self, requests):
+        # Without batching LitServe passes a single request
+        single = isinstance(requests, dict)
+        if single:
+            requests = [requests]
+        results = [{**request, "encoded": None} for request in requests]
+        for indices in self.group_misses(requests):
+            for index, image in zip(indices, self.generate(requests, indices)):
+                # Encode on a worker thread while the GPU moves on to the next group
+                results[index]["encoded"] = self.encoder.submit(self.encode_result, image, requests[index])
+
+        return results[0] if single else results
+
+    def predict_stream(self, requests, single):
+        """Yield events for the whole batch: previews while each group denoises, then its images.
+
+        Every yield has one entry per request; requests with nothing new get None.
+        """
+        def emit(events):
+            return events[0] if single else events
+
+        if any(request["cached"] is not None for request in requests):
+            yield emit([{**request, "event": "image", "encoded": None} if request["cached"] is not None else None for request in requests])
+
+        for indices in self.group_misses(requests):
+            first = requests[indices[0]]
+            steps = first["num_inference_steps"]
+            previews = queue.Queue()
+
+            def on_step_end(pipe, step, timestep, callback_kwargs):
+                # The last step is followed by the real image, so it gets no preview
+                if step + 1 < steps and any(requests[i]["preview"] for i in indices):
+                    previews.put((step + 1, self.latents_to_previews(callback_kwargs["latents"], first["width"], first["height"])))
+                return callback_kwargs
+
+            future = self.pipeline_runner.submit(self.generate, requests, indices, on_step_end)
+            future.add_done_callback(lambda _, previews=previews: previews.put(None))
+            while (item := previews.get()) is not None:
+                step, images = item
+                events = [None] * len(requests)
+                for index, image in zip(indices, images):
+                    if requests[index]["preview"]:
+                        events[index] = {"event": "preview", "step": step, "steps": steps, "image": image}
+                yield emit(events)
+
+            events = [None] * len(requests)
+            for index, image in zip(indices, future.result()):
+                events[index] = {**requests[index], "event": "image", "encoded": self.encoder.submit(self.encode_result, image, requests[index])}
+            yield emit(events)
+
+    def unbatch(self, results):
+        return results
+
+    def final_content(self, result):
+        content = result["cached"]
+        if content is None:
+            content = result["encoded"].result()
+            if result["cache_key"] is not None:
+                self.result_cache.put(result["cache_key"], content)
+        return content
+
+    def encode_event(self, event):
+        if event is None:
+            return ""
+        if event["event"] == "preview":
+            buffered = BytesIO()
+            event["image"].save(buffered, format="JPEG", quality=PREVIEW_QUALITY)
+            return {
+                "type": "preview",
+                "step": event["step"],
+                "steps": event["steps"],
+                "format": "jpeg",
+                "image": base64.b64encode(buffered.getvalue()).decode("ascii"),
+            }
+        content = self.final_content(event)
+        if event.get("thumbnail"):
+            body = json.loads(content)
+        else:
+            body = {"format": event["format"], "image": base64.b64encode(content).decode("ascii")}
+        return {"type": "image", "seed": event["seed"], "cached": event["cached"] is not None, **body}
+
+    def encode_response(self, result):
+        content = self.final_content(result)
+        headers = {
+            "Content-Type": self.content_type(result),
+            "X-Seed": str(result["seed"]),
+            "X-Cache": "bypass" if result["cache_key"] is None else "miss" if result["cached"] is None else "hit",
+        }
+        return Response(content=content, headers=headers)
+
+class FluxStreamLitAPI(FluxLitAPI):
+    """Streams previews while each image denoises, then the image, as newline-delimited JSON.
+
+    LitServe only accepts a streaming API whose predict, unbatch and encode_response are
+    generator functions, so they are overridden here rather than branching in FluxLitAPI.
+    """
+
+    def predict(self, requests):
+        single = isinstance(requests, dict)
+        yield from self.predict_stream([requests] if single else requests, single)
+
+    def unbatch(self, outputs):
+        yield from outputs
+
+    def encode_response(self, outputs):
+        for output in outputs:
+            yield [self.encode_event(event) for event in output] if isinstance(output, list) else self.encode_event(output)
 
 # Starting the server
 if __name__ == "__main__":
-    api = FluxLitAPI()
-    server = ls.LitServer(api, timeout=False)
-    server.run(port=8000)
+    if "--export" in sys.argv:
+        # One-time export ahead of deployment, so no worker pays for quantization
+        load_transformer_and_t5()
+        sys.exit(0)
+
+    stream = STREAM or "--stream" in sys.argv
+    api = FluxStreamLitAPI() if stream else FluxLitAPI()
+    server = ls.LitServer(api, timeout=False, max_batch_size=MAX_BATCH_SIZE, batch_timeout=BATCH_TIMEOUT, stream=stream)
+    add_job_routes(server.app, ImageJobQueue(f"http://127.0.0.1:{PORT}/predict", max_queued=JOB_QUEUE_SIZE, concurrency=JOB_CONCURRENCY))
+    # Jobs are kept in this process's memory, so a second API server would not know about
+    # jobs submitted to the first; keep one
+    server.run(port=PORT, num_api_servers=1)
@@ -1,10 +1,190 @@
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
+import os
+import threading
+import time
+import httpx
 import ollama
 
+from background_loop import BackgroundLoop
+
+def default_hosts() -> List[str]:
+    """Hosts from OLLAMA_HOSTS (comma-separated), falling back to OLLAMA_HOST or the local default."""
+    hosts = os.environ.get("OLLAMA_HOSTS") or os.environ.get("OLLAMA_HOST") or "http://127.0.0.1:11434"
+    return [host.strip() for host in hosts.split(",") if host.strip()]
+
+class OllamaHost:
+    def __init__(self, url: str):
+        self.url = url
+        self.client = None
+        self.transport = None
+        self.in_flight = 0
+        self.latency = None  # Exponentially weighted seconds per request
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def get_client(self) -> ollama.AsyncClient:
+        # Created lazily on the background loop, which owns its connection pool
+        if self.client is None:
+            # The transport holds the connection pool; owning it lets close() shut the pool
+            # down through httpx's public API instead of the client's internals
+            self.transport = httpx.AsyncHTTPTransport()
+            self.client = ollama.AsyncClient(host=self.url, transport=self.transport)
+        return self.client
+
+    async def close(self):
+        if self.transport is not None:
+            await self.transport.aclose()
+        self.transport = None
+        self.client = None
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def record_success(self, elapsed: float, smoothing: float):
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.latency = elapsed if self.latency is None else smoothing * elapsed + (1 - smoothing) * self.latency
+
+    def record_failure(self, failure_threshold: int, cooldown: float):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= failure_threshold:
+            # Out of rotation for a while; the first request after the cooldown probes it again
+            self.unhealthy_until = time.monotonic() + cooldown
+
+class OllamaClientManager:
+    """Long-lived Ollama clients shared by every session, spread across one or more hosts.
+
+    Each host keeps one ollama.AsyncClient, and with it one keep-alive connection pool,
+    on the background loop. Requests go to the healthy host with the fewest requests in
+    flight ("least_busy") or the lowest expected wait ("latency"). A host that fails
+    `failure_threshold` times in a row is skipped for `cooldown` seconds, and a request
+    that cannot reach its host is retried on the next one.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    STRATEGIES = ("least_busy", "latency")
+
+    def __init__(self, hosts: Optional[List[str]] = None, strategy: str = "least_busy", failure_threshold: int = 2,
+                 cooldown: float = 30.0, latency_smoothing: float = 0.2):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}', expected one of {self.STRATEGIES}")
+        self.hosts = [OllamaHost(url) for url in (hosts or default_hosts())]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency_smoothing = latency_smoothing
+        self.background_loop = BackgroundLoop.get()
+        self.background_loop.on_shutdown(self.close)
+
+    @classmethod
+    def get(cls) -> "OllamaClientManager":
+        """Return the process-wide manager, configured from the environment on first use."""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def load(self, host: OllamaHost) -> float:
+        if self.strategy == "latency":
+            return (host.in_flight + 1) * (host.latency or 0.0)
+        return host.in_flight
+
+    def pick_hosts(self) -> List[OllamaHost]:
+        """Hosts in the order they should be tried: healthy ones by load, then the rest."""
+        healthy = sorted((h for h in self.hosts if h.healthy), key=self.load)
+        unhealthy = sorted((h for h in self.hosts if not h.healthy), key=lambda h: h.unhealthy_until)
+        return healthy + unhealthy
+
+    @staticmethod
+    def is_host_failure(error: Exception) -> bool:
+        if isinstance(error, ollama.ResponseError):
+            return error.status_code >= 500
+        return isinstance(error, (httpx.TransportError, ConnectionError))
+
+    async def _chat(self, **kwargs) -> Dict[str, any]:
+        last_error = None
+        for host in self.pick_hosts():
+            host.in_flight += 1
+            start = time.monotonic()
+            try:
+                response = await host.get_client().chat(**kwargs)
+                host.record_success(time.monotonic() - start, self.latency_smoothing)
+                return response
+            except Exception as e:
+                if not self.is_host_failure(e):
+                    raise
+                host.record_failure(self.failure_threshold, self.cooldown)
+                last_error = e
+            finally:
+                host.in_flight -= 1
+        raise last_error
+
+    async def _chat_stream(self, **kwargs) -> AsyncIterator[Dict[str, any]]:
+        last_error = None
+        for host in self.pick_hosts():
+            host.in_flight += 1
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in await host.get_client().chat(stream=True, **kwargs):
+                    started = True
+                    yield chunk
+                host.record_success(time.monotonic() - start, self.latency_smoothing)
+                return
+            except Exception as e:
+                # Once tokens have been handed out the request cannot move to another host
+                if started or not self.is_host_failure(e):
+                    raise
+                host.record_failure(self.failure_threshold, self.cooldown)
+                last_error = e
+            finally:
+                host.in_flight -= 1
+        raise last_error
+
+    async def chat(self, **kwargs) -> Dict[str, any]:
+        return await self.background_loop.run(self._chat(**kwargs))
+
+    async def chat_stream(self, **kwargs) -> AsyncIterator[Dict[str, any]]:
+        async for chunk in self.background_loop.stream(self._chat_stream(**kwargs)):
+            yield chunk
+
+    async def close(self):
+        for host in self.hosts:
+            await host.close()
+
+    def get_stats(self) -> List[Dict[str, any]]:
+        return [
+            {
+                "host": host.url,
+                "healthy": host.healthy,
+                "in_flight": host.in_flight,
+                "latency": round(host.latency, 3) if host.latency is not None else None,
+                "requests": host.requests,
+                "failures": host.failures,
+            }
+            for host in self.hosts
+        ]
+
 class OllamaClient:
-    def __init__(self, model: str):
-        self.client = ollama.AsyncClient()
+    def __init__(self, model: str, manager: Optional[OllamaClientManager] = None):
+        self.client = manager or OllamaClientManager.get()
         self.model = model
 
     async def chat(self, messages: List[Dict[str, str]], tools: Optional[List[Dict]] = None, options: Optional[Dict] = None) -> Dict[str, any]:
-        return await self.client.chat(model=self.model, messages=messages, tools=tools, options=options)
\ No newline at end of file
+        return await self.client.chat(model=self.model, messages=messages, tools=tools, options=options)
+
+    async def chat_stream(self, messages: List[Dict[str, str]], tools: Optional[List[Dict]] = None, options: Optional[Dict] = None) -> AsyncIterator[Dict[str, any]]:
+        """Yield response chunks as the server produces them.
+
+        Ollama sends each tool call in the chunk where it is complete, so callers can
+        act on `chunk['message']['tool_calls']` before the stream has finished.
+        """
+        async for chunk in self.client.chat_stream(model=self.model, messages=messages, tools=tools, options=options):
+            yield chunk
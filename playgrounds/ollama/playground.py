@@ -1,6 +1,14 @@
-from tool_manager import ToolManager
-from ollama_client import OllamaClient
+import os
+import sys
+
+# Code shared by the playgrounds lives next to them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+from tool_manager import ToolManager, ToolCallBatch
+from ollama_client import OllamaClient, OllamaClientManager
 from utils import get_ollama_options
+from context_window import ContextWindow
+from stream_renderer import StreamRenderer
 from PIL import Image
 
 import streamlit as st
@@ -10,82 +18,214 @@ import ollama
 import io
 
 from tools.web_scraper import WebScraper
+from tools.web_crawler import WebCrawler
 from tools.calculator import CalculatorTool
 from tools.flux import FluxTool
 
 DEFAULT_SYSTEM_MESSAGE = """You are an AI assistant specialized in processing queries and using tools when necessary. 
 Always follow the specific instructions provided for each tool when you use them. If tools are referenced, give a simple response that mirrors the users request."""
 
-async def process_query(query: str, model: str, tool_manager: ToolManager, options: dict, system_message: str, tool_instructions: dict, chat_history: list):
-    ollama_client = OllamaClient(model)
-    
-    working_history = chat_history.copy()
+def build_working_history(query: str, system_message: str, chat_history: list, context_window: ContextWindow = None, options: dict = None, tools: list = None) -> list:
+    system = {'role': 'system', 'content': system_message}
+    history = chat_history[1:] if chat_history and chat_history[0]['role'] == 'system' else chat_history
     
-    if not working_history or working_history[0]['role'] != 'system':
-        working_history.insert(0, {'role': 'system', 'content': system_message})
-    else:
-        working_history[0]['content'] = system_message
+    if context_window is not None:
+        history = context_window.fit(history, context_window.history_budget(options or {}, [system], tools))
     
-    working_history.append({'role': 'user', 'content': query})
+    working_history = [system] + list(history)
     
-    active_tools = tool_manager.get_active_tools()
-    
-    response = await ollama_client.chat(working_history, active_tools, options)
-    working_history.append(response['message'])
-    
-    if active_tools and response['message'].get('tool_calls'):
-        for tool_call in response['message']['tool_calls']:
-            tool_name = tool_call['function']['name']
-            tool_args = tool_call['function']['arguments']
+    # main() records the query in chat_history before calling process_query
+    if working_history[-1]['role'] != 'user' or working_history[-1]['content'] != query:
+        working_history.append({'role': 'user', 'content': query})
+    return working_history
+
+def add_tool_results(working_history: list, tool_calls: list, tool_results: list, tool_manager: ToolManager, tool_instructions: dict):
+    # Results come back in call order, so the history reads the same as a sequential run
+    for tool_call, tool_result in zip(tool_calls, tool_results):
+        tool_name = tool_call['function']['name']
+        tool_args = tool_call['function']['arguments']
+        
+        # Check if the tool result contains an image (Flux passes the encoded bytes straight through)
+        if isinstance(tool_result.get('response'), (Image.Image, bytes)):
+            image = tool_result['response']
+            with st.expander(f"Generated Image for '{tool_args['prompt']}'", expanded=True):
+                st.image(image, caption=f"Generated Image for '{tool_args['prompt']}'")
             
-            st.sidebar.write(f"Using tool: {tool_name}")
-            st.sidebar.write(f"Tool arguments: {tool_args}")
+            # Update the chat history with a concise message
+            working_history.append({
+                'role': 'assistant',
+                'content': f"An image was generated for the prompt: '{tool_args['prompt']}'. Please check the image displayed."
+            })
+        else:
+            # Handle non-image results
+            formatted_data = json.dumps(tool_result.get('extracted_data', tool_result), indent=2)
             
-            with st.spinner(text="Generating with Flux..."):
-                tool_result = await tool_manager.execute_tool(tool_name, **tool_args)
+            working_history.append({
+                'role': 'function',
+                'name': tool_name,
+                'content': formatted_data,
+            })
             
-            # Check if the tool result contains an image
-            if isinstance(tool_result['response'], Image.Image):
-                image = tool_result['response']
-                with st.expander(f"Generated Image for '{tool_args['prompt']}'", expanded=True):
-                    st.image(image, caption=f"Generated Image for '{tool_args['prompt']}'")
-                
-                # Update the chat history with a concise message
-                working_history.append({
-                    'role': 'assistant',
-                    'content': f"An image was generated for the prompt: '{tool_args['prompt']}'. Please check the image displayed."
-                })
-            else:
-                # Handle non-image results
-                formatted_data = json.dumps(tool_result.get('extracted_data', tool_result), indent=2)
-                
-                working_history.append({
-                    'role': 'function',
-                    'name': tool_name,
-                    'content': formatted_data,
-                })
-                
-                tool_instructions_content = tool_instructions.get(tool_name)
-                tool_instance = tool_manager.get_tool(tool_name)
-                
-                if tool_instructions_content and hasattr(tool_instance, 'instructions'):
-                    additional_instruction = {
-                        'role': 'user',
-                        'content': f"""Here is the data from the {tool_name}:
+            tool_instructions_content = tool_instructions.get(tool_name)
+            tool_instance = tool_manager.get_tool(tool_name)
+            
+            if tool_instructions_content and hasattr(tool_instance, 'instructions'):
+                additional_instruction = {
+                    'role': 'user',
+                    'content': f"""Here is the data from the {tool_name}:
 
 {formatted_data}
 
 Instructions for processing this data:
 {tool_instructions_content}"""
-                    }
-                    
-                    working_history.append(additional_instruction)
+                }
+                
+                working_history.append(additional_instruction)
+
+def show_image_preview(placeholders: dict):
+    """Return a FluxTool preview callback that shows the latest preview of each prompt in its own placeholder."""
+    def show(prompt: str, image: bytes, step: int, steps: int):
+        if prompt not in placeholders:
+            placeholders[prompt] = st.empty()
+        placeholders[prompt].image(image, caption=f"Preview for '{prompt}' (step {step} of {steps})", width=256)
+    return show
+
+def show_image_jobs(image_jobs: list):
+    """Show the background images attached to one assistant message."""
+    for job in image_jobs:
+        if job['status'] == 'done':
+            with st.expander(f"Generated Image for '{job['prompt']}'", expanded=True):
+                st.image(job['image'], caption=f"Generated Image for '{job['prompt']}'")
+        elif job['status'] in ('queued', 'running'):
+            st.caption(f"Generating an image for '{job['prompt']}' ({job['status']})...")
+        else:
+            st.caption(f"Image for '{job['prompt']}' {job['status']}. {job.get('error') or ''}")
+
+@st.fragment(run_every=2)
+def poll_image_jobs(flux: FluxTool):
+    """Poll the background images still in progress and rerun the app once any of them finishes."""
+    pending = [job for job in st.session_state.image_jobs if job['status'] in ('queued', 'running')]
+    finished = False
+    for job in pending:
+        try:
+            status = flux.get_job(job['job_id'])
+        except Exception as e:
+            job.update(status='failed', error=str(e))
+            finished = True
+            continue
+        job.update(status=status['status'], error=status.get('error'))
+        if status['status'] == 'done':
+            job['image'] = status['image']
+        finished = finished or job['status'] not in ('queued', 'running')
+
+    if finished:
+        st.rerun()
+    try:
+        st.caption(f"{len(pending)} image(s) in progress, {flux.get_job_stats()['queue_depth']} waiting on the server")
+    except Exception:
+        st.caption(f"{len(pending)} image(s) in progress")
+    for job in pending:
+        prompt_column, cancel_column = st.columns([4, 1])
+        prompt_column.write(f"'{job['prompt']}' ({job['status']})")
+        if cancel_column.button("Cancel", key=f"cancel_{job['job_id']}"):
+            try:
+                flux.cancel_job(job['job_id'])
+            except Exception as e:
+                st.warning(f"Could not cancel the image for '{job['prompt']}': {e}")
+                continue
+            job['status'] = 'cancelled'
+            st.rerun()
+
+def log_tool_call(tool_call: dict):
+    st.sidebar.write(f"Using tool: {tool_call['function']['name']}")
+    st.sidebar.write(f"Tool arguments: {tool_call['function']['arguments']}")
+
+async def process_query(query: str, model: str, tool_manager: ToolManager, options: dict, system_message: str, tool_instructions: dict, chat_history: list, concurrent_tools: bool = True, context_window: ContextWindow = None):
+    ollama_client = OllamaClient(model)
+    
+    active_tools = tool_manager.get_active_tools()
+    
+    working_history = build_working_history(query, system_message, chat_history, context_window, options, active_tools)
+    
+    response = await ollama_client.chat(working_history, active_tools, options)
+    working_history.append(response['message'])
+    
+    if active_tools and response['message'].get('tool_calls'):
+        tool_calls = response['message']['tool_calls']
+        for tool_call in tool_calls:
+            log_tool_call(tool_call)
+        
+        with st.spinner(text="Generating with Flux..."):
+            if concurrent_tools:
+                tool_results = await tool_manager.execute_tools(tool_calls)
+            else:
+                tool_results = [
+                    await tool_manager.execute_tool(tool_call['function']['name'], **tool_call['function']['arguments'])
+                    for tool_call in tool_calls
+                ]
+        
+        first_result = len(working_history)
+        add_tool_results(working_history, tool_calls, tool_results, tool_manager, tool_instructions)
+        if context_window is not None:
+            context_window.fit_tool_results(working_history, first_result, options)
         
         final_response = await ollama_client.chat(working_history, options=options)
         return final_response['message']['content']
     
     return response['message']['content']
 
+async def process_query_stream(query: str, model: str, tool_manager: ToolManager, options: dict, system_message: str, tool_instructions: dict, chat_history: list, concurrent_tools: bool = True, context_window: ContextWindow = None):
+    """Streaming variant of process_query.
+
+    Yields {'type': 'token', 'content': ...} for each piece of text and
+    {'type': 'tool_call', 'tool_call': ...} when the model calls a tool. Tool calls are
+    dispatched the moment they appear in the stream, while the rest of it is still
+    arriving. Text streamed before a tool call is superseded by the final answer.
+    """
+    ollama_client = OllamaClient(model)
+    
+    active_tools = tool_manager.get_active_tools()
+    
+    working_history = build_working_history(query, system_message, chat_history, context_window, options, active_tools)
+    
+    batch = ToolCallBatch(tool_manager)
+    tool_calls = []
+    content = []
+    async for chunk in ollama_client.chat_stream(working_history, active_tools, options):
+        message = chunk['message']
+        if message.get('content'):
+            content.append(message['content'])
+            yield {'type': 'token', 'content': message['content']}
+        for tool_call in message.get('tool_calls') or []:
+            tool_calls.append(tool_call)
+            log_tool_call(tool_call)
+            if concurrent_tools:
+                batch.submit(tool_call)
+            yield {'type': 'tool_call', 'tool_call': tool_call}
+    
+    working_history.append({'role': 'assistant', 'content': ''.join(content), 'tool_calls': tool_calls})
+    
+    if not (active_tools and tool_calls):
+        return
+    
+    with st.spinner(text="Generating with Flux..."):
+        if concurrent_tools:
+            tool_results = await batch.results()
+        else:
+            tool_results = [
+                await tool_manager.execute_tool(tool_call['function']['name'], **tool_call['function']['arguments'])
+                for tool_call in tool_calls
+            ]
+    
+    first_result = len(working_history)
+    add_tool_results(working_history, tool_calls, tool_results, tool_manager, tool_instructions)
+    if context_window is not None:
+        context_window.fit_tool_results(working_history, first_result, options)
+    
+    async for chunk in ollama_client.chat_stream(working_history, options=options):
+        if chunk['message'].get('content'):
+            yield {'type': 'token', 'content': chunk['message']['content']}
+
 async def main():
     st.set_page_config(page_title="Ollama GPT-4o", layout="wide", page_icon="https://ollama.com/public/icon-64x64.png")
     
@@ -100,18 +240,27 @@ async def main():
         pull = st.button(f"ollama pull {model}")
         st.sidebar.info("**If you have not pulled the model from Ollama, you can do so in the Ollama controls expander.**")
         if pull:
-            ollama.pull(model)
+            for host in OllamaClientManager.get().hosts:
+                ollama.Client(host=host.url).pull(model)
+        st.dataframe(OllamaClientManager.get().get_stats(), hide_index=True)
     
     if 'tool_manager' not in st.session_state:
         st.session_state.tool_manager = ToolManager()
         # Initialize tools here
-        st.session_state.tool_manager.register_tool("web_scraper", WebScraper())
+        web_scraper = WebScraper()
+        st.session_state.tool_manager.register_tool("web_scraper", web_scraper)
+        st.session_state.tool_manager.register_tool("web_crawler", WebCrawler(web_scraper))
         st.session_state.tool_manager.register_tool("calculator", CalculatorTool())
-        st.session_state.tool_manager.register_tool("flux", FluxTool())
+        st.session_state.tool_manager.register_tool("flux", FluxTool(use_jobs=True))
+    flux = st.session_state.tool_manager.get_tool("flux")
 
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
     
+    # Images generated in the background, attached to the assistant message of the turn that asked for them
+    if 'image_jobs' not in st.session_state:
+        st.session_state.image_jobs = []
+    
     if 'tool_instructions' not in st.session_state:
         st.session_state.tool_instructions = {}
     
@@ -130,6 +279,24 @@ async def main():
         st.session_state.tool_switches[tool_name] = use_tool
         st.session_state.tool_manager.set_tool_switch(tool_name, use_tool)
     
+    concurrent_tools = st.sidebar.toggle("Run tool calls concurrently", value=True, key="concurrent_tools")
+    stream_responses = st.sidebar.toggle("Stream responses", value=True, key="stream_responses")
+    trim_history = st.sidebar.toggle("Fit history to the context window", value=True, key="trim_history")
+    flux.use_jobs = st.sidebar.toggle("Generate images in the background", value=True, key="background_images")
+    
+    if 'context_window' not in st.session_state:
+        st.session_state.context_window = ContextWindow()
+    context_window = st.session_state.context_window if trim_history else None
+    if context_window is not None:
+        with st.sidebar.expander("Context Window"):
+            st.json(context_window.get_stats())
+    
+    web_scraper = st.session_state.tool_manager.get_tool("web_scraper")
+    if web_scraper is not None and (st.session_state.tool_switches.get("web_scraper", False) or st.session_state.tool_switches.get("web_crawler", False)):
+        with st.sidebar.expander("Scrape Cache"):
+            st.json(web_scraper.cache.get_stats())
+            st.json(web_scraper.fetch_stats)
+    
     # System message editor
     st.sidebar.subheader("System Message")
     system_message = st.sidebar.text_area("System Message", DEFAULT_SYSTEM_MESSAGE, height=150)
@@ -148,9 +315,10 @@ async def main():
                 )
 
     # Display chat history
-    for chat in st.session_state.chat_history:
+    for index, chat in enumerate(st.session_state.chat_history):
         with st.chat_message(chat["role"]):
             st.markdown(chat["content"])
+            show_image_jobs([job for job in st.session_state.image_jobs if job['message_index'] == index])
 
     if prompt := st.chat_input("Ask a question or request a task"):
         st.session_state.chat_history.append({"role": "user", "content": prompt})
@@ -160,8 +328,26 @@ async def main():
         with st.chat_message("assistant"):
             message_placeholder = st.empty()
             message_placeholder.markdown("Processing...")
+
+            # Previews streamed by the flux server show up here until the final image arrives
+            preview_placeholders = {}
+            flux.preview_callback = show_image_preview(preview_placeholders)
             
-            result = await process_query(prompt, model, st.session_state.tool_manager, ollama_options, system_message, st.session_state.tool_instructions, st.session_state.chat_history)
+            if stream_responses:
+                renderer = StreamRenderer(message_placeholder)
+                async for event in process_query_stream(prompt, model, st.session_state.tool_manager, ollama_options, system_message, st.session_state.tool_instructions, st.session_state.chat_history, concurrent_tools, context_window):
+                    if event['type'] == 'tool_call':
+                        # Whatever was said before the tool call gives way to the final answer
+                        renderer = StreamRenderer(message_placeholder)
+                        message_placeholder.markdown(f"Using {event['tool_call']['function']['name']}...")
+                    else:
+                        renderer.write(event['content'])
+                # The final draw below renders the answer once, as JSON or markdown
+                result = renderer.text
+            else:
+                result = await process_query(prompt, model, st.session_state.tool_manager, ollama_options, system_message, st.session_state.tool_instructions, st.session_state.chat_history, concurrent_tools, context_window)
+            for placeholder in preview_placeholders.values():
+                placeholder.empty()
             
             try:
                 json_result = json.loads(result)
@@ -171,6 +357,12 @@ async def main():
                 message_placeholder.markdown(result)
             
             st.session_state.chat_history.append({"role": "assistant", "content": result})
+            for job in flux.take_submitted_jobs():
+                st.session_state.image_jobs.append({**job, 'status': 'queued', 'message_index': len(st.session_state.chat_history) - 1})
+            show_image_jobs([job for job in st.session_state.image_jobs if job['message_index'] == len(st.session_state.chat_history) - 1])
+
+    if any(job['status'] in ('queued', 'running') for job in st.session_state.image_jobs):
+        poll_image_jobs(flux)
 
 if __name__ == "__main__":
     asyncio.run(main())
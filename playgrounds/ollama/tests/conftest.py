@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the playground's modules the way playground.py does, from its directory
+PLAYGROUND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PLAYGROUND_DIR)
+sys.path.insert(0, os.path.join(PLAYGROUND_DIR, "..", "shared"))
@@ -0,0 +1,26 @@
+from context_window import TRUNCATION_NOTE, ContextWindow
+
+OPTIONS = {"num_ctx": 2048, "num_predict": 128}
+
+def request_tokens(context_window, messages):
+    return sum(context_window.estimator.count_message(message) for message in messages)
+
+def test_large_tool_results_are_cut_to_fit_the_context():
+    context_window = ContextWindow()
+    messages = [
+        {"role": "system", "content": "You are helpful. " * 20},
+        {"role": "user", "content": "Summarize the page"},
+        {"role": "function", "name": "web_scraper", "content": "word " * 5000},
+        {"role": "function", "name": "calculator", "content": '{"result": 4}'},
+    ]
+    context_window.fit_tool_results(messages, 2, OPTIONS)
+    assert request_tokens(context_window, messages) <= OPTIONS["num_ctx"] - OPTIONS["num_predict"]
+    assert messages[2]["content"].endswith(TRUNCATION_NOTE)
+    # The small result fits in its share and is left alone
+    assert messages[3]["content"] == '{"result": 4}'
+
+def test_tool_results_that_fit_are_untouched():
+    context_window = ContextWindow()
+    messages = [{"role": "user", "content": "What is 2+2?"}, {"role": "function", "name": "calculator", "content": '{"result": 4}'}]
+    context_window.fit_tool_results(messages, 1, OPTIONS)
+    assert messages[1]["content"] == '{"result": 4}'
@@ -0,0 +1,25 @@
+import pytest
+
+from tools.expression_engine import ExpressionEngine, ExpressionError
+
+@pytest.mark.parametrize("value", ["ab", "hello", True, None, [1, 2], {"a": 1}])
+def test_evaluate_rejects_non_numeric_bindings(value):
+    engine = ExpressionEngine()
+    with pytest.raises(ExpressionError, match="must be a number"):
+        engine.evaluate("x*100000000", {"x": value})
+
+@pytest.mark.parametrize("bindings", [
+    {"x": ["ab", 1]},
+    {"x": "ab"},
+    {"x": [True, False]},
+    [{"x": 1}, {"x": "ab"}],
+])
+def test_evaluate_batch_rejects_non_numeric_bindings(bindings):
+    engine = ExpressionEngine()
+    with pytest.raises(ExpressionError, match="must be a number"):
+        engine.evaluate_batch("x*100000000", bindings)
+
+def test_numeric_bindings_still_evaluate():
+    engine = ExpressionEngine()
+    assert engine.evaluate("x*2 + y", {"x": 3, "y": 0.5}) == 6.5
+    assert engine.evaluate_batch("x*2", {"x": [1, 2.5]}) == [2, 5.0]
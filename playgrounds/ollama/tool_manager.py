@@ -1,26 +1,97 @@
 from typing import List, Dict, Any
+import asyncio
+
+class ToolCallBatch:
+    """The tool calls of one turn, started as soon as they are submitted.
+
+    Calls to the same tool share a semaphore sized by ToolManager.get_tool_concurrency.
+    Failures are returned in place as {'error': ...} so one bad call does not cancel
+    the rest of the turn. Create one batch per turn so its semaphores belong to the
+    running event loop.
+    """
+
+    def __init__(self, tool_manager: "ToolManager"):
+        self.tool_manager = tool_manager
+        self.semaphores = {}
+        self.tasks = []
+
+    def submit(self, tool_call: Dict[str, Any]) -> asyncio.Task:
+        task = asyncio.ensure_future(self.run(tool_call))
+        self.tasks.append(task)
+        return task
+
+    async def run(self, tool_call: Dict[str, Any]) -> Any:
+        tool_name = tool_call['function']['name']
+        tool_args = tool_call['function']['arguments']
+        if tool_name not in self.semaphores:
+            self.semaphores[tool_name] = asyncio.Semaphore(self.tool_manager.get_tool_concurrency(tool_name))
+        async with self.semaphores[tool_name]:
+            try:
+                return await self.tool_manager.execute_tool(tool_name, **tool_args)
+            except Exception as e:
+                return {'error': str(e)}
+
+    async def results(self) -> List[Any]:
+        return await asyncio.gather(*self.tasks)
 
 class ToolManager:
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 4):
         self.tools = {}
         self.tool_switches = {}
+        self.tool_instructions = {}
+        self.max_concurrency = max_concurrency
+        # Schemas and entry points are resolved once per tool at registration
+        self.schemas = {}
+        self.callables = {}
+        # Bumped whenever the set of active tools changes; get_tools() rebuilds only then
+        self.version = 0
+        self._active_tools = []
+        self._active_tools_version = -1
+
+    @staticmethod
+    def resolve_callable(name: str, tool_instance):
+        if hasattr(tool_instance, 'query_page_content'):
+            return tool_instance.query_page_content
+        elif hasattr(tool_instance, 'execute'):
+            return tool_instance.execute
+        raise ValueError(f"Tool '{name}' does not have a valid execution method")
+
+    @staticmethod
+    def build_schema(name: str, tool_instance) -> Dict[str, Any]:
+        return {
+            'type': 'function',
+            'function': {
+                'name': name,
+                'description': getattr(tool_instance, 'description', ''),
+                'parameters': getattr(tool_instance, 'parameters', {}),
+            }
+        }
 
     def register_tool(self, name: str, tool_instance):
+        self.callables[name] = self.resolve_callable(name, tool_instance)
+        self.schemas[name] = self.build_schema(name, tool_instance)
         self.tools[name] = tool_instance
         self.tool_switches[name] = False
+        if getattr(tool_instance, 'instructions', ''):
+            self.tool_instructions[name] = tool_instance.instructions
+        self.version += 1
+
+    def refresh_tool(self, name: str):
+        """Rebuild a tool's schema after its description or parameters were changed in place."""
+        if name in self.tools:
+            self.schemas[name] = self.build_schema(name, self.tools[name])
+            self.version += 1
         
     def get_tools(self) -> List[Dict[str, Any]]:
-        return [
-            {
-                'type': 'function',
-                'function': {
-                    'name': name,
-                    'description': getattr(tool, 'description', ''),
-                    'parameters': getattr(tool, 'parameters', {}),
-                }
-            }
-            for name, tool in self.tools.items() if self.tool_switches[name]
-        ]
+        """Return the schemas of the active tools.
+
+        The list is cached until the next registration or switch change and is shared
+        between callers, so treat it as read-only.
+        """
+        if self._active_tools_version != self.version:
+            self._active_tools = [self.schemas[name] for name in self.tools if self.tool_switches[name]]
+            self._active_tools_version = self.version
+        return self._active_tools
 
     def get_tool(self, name: str):
         return self.tools.get(name)
@@ -45,8 +116,9 @@ class ToolManager:
         ])
 
     def set_tool_switch(self, name: str, state: bool):
-        if name in self.tool_switches:
+        if name in self.tool_switches and self.tool_switches[name] != state:
             self.tool_switches[name] = state
+            self.version += 1
 
     def get_tool_switch(self, name: str) -> bool:
         return self.tool_switches.get(name, False)
@@ -55,15 +127,20 @@ class ToolManager:
         return self.get_tools()
 
     async def execute_tool(self, tool_name: str, **kwargs) -> Any:
-        if tool_name not in self.tools or not self.tool_switches[tool_name]:
+        if not self.tool_switches.get(tool_name):
             raise ValueError(f"Tool '{tool_name}' not found or not active")
-        tool = self.tools[tool_name]
-        if hasattr(tool, 'query_page_content'):
-            return await tool.query_page_content(**kwargs)
-        elif hasattr(tool, 'execute'):
-            return await tool.execute(**kwargs)
-        else:
-            raise ValueError(f"Tool '{tool_name}' does not have a valid execution method")
+        return await self.callables[tool_name](**kwargs)
+
+    def get_tool_concurrency(self, name: str) -> int:
+        # Tools can cap how many of their calls run at once with a `max_concurrency` attribute
+        return getattr(self.tools.get(name), 'max_concurrency', self.max_concurrency)
+
+    async def execute_tools(self, tool_calls: List[Dict[str, Any]]) -> List[Any]:
+        """Run a turn's tool calls concurrently and return the results in call order."""
+        batch = ToolCallBatch(self)
+        for tool_call in tool_calls:
+            batch.submit(tool_call)
+        return await batch.results()
 
     def get_tool_description(self, name: str) -> str:
         if name in self.tools:
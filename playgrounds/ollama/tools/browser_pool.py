@@ -0,0 +1,134 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List
+from playwright.async_api import async_playwright, Browser, Page
+
+class BrowserWorker:
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.active_pages = 0
+        self.total_pages = 0
+        self.crashed = False
+        browser.on("disconnected", lambda _: self.mark_crashed())
+
+    def mark_crashed(self):
+        self.crashed = True
+
+    @property
+    def alive(self) -> bool:
+        return not self.crashed and self.browser.is_connected()
+
+class BrowserPool:
+    """A set of long-lived browsers that hand out isolated pages.
+
+    Each borrowed page lives in its own browser context, so cookies and storage never
+    leak between scrapes. A browser is replaced once it crashes or has served
+    `max_pages_per_browser` pages, which keeps slow memory growth in Chromium bounded.
+    The pool must only be used from a single event loop.
+    """
+
+    def __init__(self, browser_type: str = "chromium", headless: bool = True, max_browsers: int = 2,
+                 max_open_pages: int = 4, max_pages_per_browser: int = 200):
+        self.browser_type = browser_type
+        self.headless = headless
+        self.max_browsers = max_browsers
+        self.max_open_pages = max_open_pages
+        self.max_pages_per_browser = max_pages_per_browser
+        self.playwright = None
+        self.workers: List[BrowserWorker] = []
+        self.closed = False
+        self._slots = asyncio.Semaphore(self.capacity)
+        self._lock = asyncio.Lock()
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_browsers * self.max_open_pages
+
+    async def start(self):
+        async with self._start_lock:
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+
+    async def launch_worker(self) -> BrowserWorker:
+        browser = await getattr(self.playwright, self.browser_type).launch(headless=self.headless)
+        return BrowserWorker(browser)
+
+    async def retire_worker(self, worker: BrowserWorker):
+        if worker in self.workers:
+            self.workers.remove(worker)
+        try:
+            await worker.browser.close()
+        except Exception:
+            # Crashed browsers can fail to close; there is nothing left to clean up
+            pass
+
+    async def acquire_worker(self) -> BrowserWorker:
+        async with self._lock:
+            for worker in [w for w in self.workers if not w.alive]:
+                await self.retire_worker(worker)
+
+            available = [
+                w for w in self.workers
+                if w.active_pages < self.max_open_pages and w.total_pages < self.max_pages_per_browser
+            ]
+            if available:
+                worker = min(available, key=lambda w: w.active_pages)
+            elif len(self.workers) < self.max_browsers:
+                worker = await self.launch_worker()
+                self.workers.append(worker)
+            else:
+                # Every browser is worn out; recycle the idlest one
+                worker = min(self.workers, key=lambda w: w.active_pages)
+                if worker.active_pages == 0:
+                    await self.retire_worker(worker)
+                    worker = await self.launch_worker()
+                    self.workers.append(worker)
+
+            worker.active_pages += 1
+            worker.total_pages += 1
+            return worker
+
+    async def release_worker(self, worker: BrowserWorker):
+        worker.active_pages -= 1
+        if worker.active_pages == 0 and (not worker.alive or worker.total_pages >= self.max_pages_per_browser):
+            async with self._lock:
+                await self.retire_worker(worker)
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a fresh page in its own browser context."""
+        if self.closed:
+            raise RuntimeError("Browser pool is closed")
+        await self.start()
+        async with self._slots:
+            worker = await self.acquire_worker()
+            context = None
+            try:
+                try:
+                    context = await worker.browser.new_context()
+                except Exception:
+                    # The browser died between checkout and use; swap it once before giving up
+                    worker.mark_crashed()
+                    await self.release_worker(worker)
+                    worker = None
+                    worker = await self.acquire_worker()
+                    context = await worker.browser.new_context()
+                page: Page = await context.new_page()
+                yield page
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        worker.mark_crashed()
+                if worker is not None:
+                    await self.release_worker(worker)
+
+    async def close(self):
+        self.closed = True
+        for worker in list(self.workers):
+            await self.retire_worker(worker)
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
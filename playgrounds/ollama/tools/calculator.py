@@ -1,4 +1,4 @@
-import math
+from tools.expression_engine import ExpressionEngine
 
 class CalculatorTool:
     def __init__(self):
@@ -10,19 +10,24 @@ class CalculatorTool:
                 "expression": {
                     "type": "string",
                     "description": "The mathematical expression to evaluate."
+                },
+                "variables": {
+                    "type": "object",
+                    "description": "Optional values for names used in the expression. Give a list of values for a name to evaluate the expression once per value."
                 }
             },
             "required": ["expression"]
         }
-        self.instructions = """Use this calculator tool to perform mathematical operations. 
-The tool can handle basic arithmetic (addition, subtraction, multiplication, division) as well as 
-square root (sqrt) and power (pow) operations. Provide the expression as a string, and the tool will evaluate it."""
+        self.instructions = """Use this calculator tool to perform mathematical operations.
+The tool can handle basic arithmetic (addition, subtraction, multiplication, division) as well as
+square root (sqrt) and power (pow) operations. Provide the expression as a string, and the tool will evaluate it.
+To sweep a parameter, use a variable name in the expression and pass its values as a list in variables."""
+        self.engine = ExpressionEngine()
 
-    async def execute(self, expression: str) -> dict:
+    async def execute(self, expression: str, variables: dict = None) -> dict:
         try:
-            # Use Python's eval function to calculate the result
-            # This is potentially dangerous in a production environment and should be used with caution
-            result = eval(expression, {"__builtins__": None}, {"sqrt": math.sqrt, "pow": math.pow})
-            return {"result": result}
+            if variables and any(isinstance(value, (list, tuple)) for value in variables.values()):
+                return {"results": self.engine.evaluate_batch(expression, variables)}
+            return {"result": self.engine.evaluate(expression, variables)}
         except Exception as e:
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
@@ -0,0 +1,278 @@
+import ast
+import math
+import threading
+from collections import OrderedDict
+from functools import reduce
+from typing import Any, Dict, List, Mapping, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # Batch evaluation falls back to a scalar loop
+    np = None
+
+class ExpressionError(ValueError):
+    pass
+
+ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
+# round() to more places than this is never meaningful for a float and costly for an int
+MAX_ROUND_DIGITS = 300
+
+def guarded(max_bits: int):
+    """Build the scalar versions of the operators whose cost grows with their operands."""
+
+    def check_bits(bits: float):
+        if bits > max_bits:
+            raise ExpressionError(f"Result would need about {int(bits)} bits, the limit is {max_bits}")
+
+    def power(base, exponent):
+        if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+            check_bits(exponent * abs(base).bit_length())
+        return base ** exponent
+
+    def multiply(a, b):
+        if isinstance(a, int) and isinstance(b, int):
+            check_bits(abs(a).bit_length() + abs(b).bit_length())
+        return a * b
+
+    def float_pow(base, exponent):
+        # Mirrors math.pow, which the calculator has always exposed as pow()
+        return math.pow(base, exponent)
+
+    def round_(number, ndigits=None):
+        if ndigits is not None:
+            if not isinstance(ndigits, int):
+                raise ExpressionError("round() takes a whole number of digits")
+            if abs(ndigits) > MAX_ROUND_DIGITS:
+                raise ExpressionError(f"round() supports at most {MAX_ROUND_DIGITS} digits")
+            if isinstance(number, int):
+                # Rounding an int to -n digits works with 10**n
+                check_bits(abs(number).bit_length() + max(0, -ndigits) * math.log2(10))
+        return round(number, ndigits)
+
+    return power, multiply, float_pow, round_
+
+SCALAR_FUNCTIONS = {
+    "sqrt": math.sqrt,
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "log2": math.log2,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "asin": math.asin,
+    "acos": math.acos,
+    "atan": math.atan,
+    "floor": math.floor,
+    "ceil": math.ceil,
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+def numpy_round(values, ndigits=0):
+    # Same digit limit as the scalar round(), so both paths accept the same expressions
+    if abs(int(ndigits)) > MAX_ROUND_DIGITS:
+        raise ExpressionError(f"round() supports at most {MAX_ROUND_DIGITS} digits")
+    return np.round(values, int(ndigits))
+
+def numpy_functions() -> Dict[str, Any]:
+    return {
+        "sqrt": np.sqrt,
+        "abs": np.abs,
+        "min": lambda *args: reduce(np.minimum, args),
+        "max": lambda *args: reduce(np.maximum, args),
+        "round": numpy_round,
+        "exp": np.exp,
+        "log": lambda x, base=None: np.log(x) if base is None else np.log(x) / np.log(base),
+        "log10": np.log10,
+        "log2": np.log2,
+        "sin": np.sin,
+        "cos": np.cos,
+        "tan": np.tan,
+        "asin": np.arcsin,
+        "acos": np.arccos,
+        "atan": np.arctan,
+        "floor": np.floor,
+        "ceil": np.ceil,
+        "pow": np.power,
+        "_pow": np.power,
+        "_mul": np.multiply,
+    }
+
+class Rewriter(ast.NodeTransformer):
+    """Route ** and * through the guarded helpers so their cost is checked before they run."""
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            helper = "_pow"
+        elif isinstance(node.op, ast.Mult):
+            helper = "_mul"
+        else:
+            return node
+        call = ast.Call(func=ast.Name(id=helper, ctx=ast.Load()), args=[node.left, node.right], keywords=[])
+        return ast.copy_location(call, node)
+
+class CompiledExpression:
+    def __init__(self, source: str, code, variables: Tuple[str, ...]):
+        self.source = source
+        self.code = code
+        self.variables = variables
+
+class ExpressionEngine:
+    """Safe arithmetic evaluator for the calculator tool.
+
+    Expressions are parsed once into a restricted AST (numbers, arithmetic, whitelisted
+    functions and free variables), compiled, and kept in an LRU cache. Integer powers and
+    products are checked against `max_bits` before they are computed, so inputs like
+    10**10**8 are rejected instead of tying up a core. evaluate_batch() runs one
+    expression over many variable bindings with NumPy when it is installed.
+    """
+
+    def __init__(self, max_cache_size: int = 256, max_length: int = 1000, max_nodes: int = 500,
+                 max_bits: int = 14_000):
+        self.max_cache_size = max_cache_size
+        self.max_length = max_length
+        self.max_nodes = max_nodes
+        # 14,000 bits is just under the 4,300 digits Python will convert an int to a string for
+        self.max_bits = max_bits
+        self.cache: "OrderedDict[str, CompiledExpression]" = OrderedDict()
+        self.lock = threading.Lock()
+        power, multiply, float_pow, round_ = guarded(max_bits)
+        self.scalar_namespace = {**SCALAR_FUNCTIONS, **CONSTANTS, "pow": float_pow, "round": round_, "_pow": power, "_mul": multiply}
+        self.numpy_namespace = {**numpy_functions(), **CONSTANTS} if np is not None else None
+        self.hits = 0
+        self.misses = 0
+
+    def validate(self, tree: ast.Expression) -> Tuple[str, ...]:
+        """Reject anything outside the arithmetic subset and return the free variable names."""
+        variables = []
+        nodes = 0
+        for node in ast.walk(tree):
+            nodes += 1
+            if nodes > self.max_nodes:
+                raise ExpressionError(f"Expression is too complex (more than {self.max_nodes} nodes)")
+            if isinstance(node, (ast.Expression, ast.Load)) or isinstance(node, ALLOWED_BINOPS + ALLOWED_UNARYOPS):
+                continue
+            if isinstance(node, ast.BinOp):
+                if not isinstance(node.op, ALLOWED_BINOPS):
+                    raise ExpressionError(f"Operator '{type(node.op).__name__}' is not allowed")
+            elif isinstance(node, ast.UnaryOp):
+                if not isinstance(node.op, ALLOWED_UNARYOPS):
+                    raise ExpressionError(f"Operator '{type(node.op).__name__}' is not allowed")
+            elif isinstance(node, ast.Constant):
+                if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                    raise ExpressionError(f"Unsupported literal {node.value!r}")
+                if isinstance(node.value, int) and node.value.bit_length() > self.max_bits:
+                    raise ExpressionError("Number literal is too large")
+            elif isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in self.scalar_namespace or node.func.id.startswith("_"):
+                    raise ExpressionError("Only the built-in math functions can be called")
+                if node.keywords:
+                    raise ExpressionError("Keyword arguments are not supported")
+            elif isinstance(node, ast.Name):
+                if node.id.startswith("_"):
+                    raise ExpressionError(f"Invalid name '{node.id}'")
+                if node.id not in self.scalar_namespace and node.id not in variables:
+                    variables.append(node.id)
+            else:
+                raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+        return tuple(variables)
+
+    def compile(self, expression: str) -> CompiledExpression:
+        with self.lock:
+            compiled = self.cache.get(expression)
+            if compiled is not None:
+                self.cache.move_to_end(expression)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        if len(expression) > self.max_length:
+            raise ExpressionError(f"Expression is longer than {self.max_length} characters")
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"Invalid expression: {e.msg}") from None
+        variables = self.validate(tree)
+        tree = ast.fix_missing_locations(Rewriter().visit(tree))
+        compiled = CompiledExpression(expression, compile(tree, "<expression>", "eval"), variables)
+
+        with self.lock:
+            self.cache[expression] = compiled
+            while len(self.cache) > self.max_cache_size:
+                self.cache.popitem(last=False)
+        return compiled
+
+    @staticmethod
+    def check_variables(compiled: CompiledExpression, names) -> None:
+        missing = [name for name in compiled.variables if name not in names]
+        if missing:
+            raise ExpressionError(f"Missing values for: {', '.join(missing)}")
+
+    @staticmethod
+    def check_number(name: str, value: Any) -> None:
+        # Strings and lists would slip past the bit guards, which only look at ints
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ExpressionError(f"The value for '{name}' must be a number")
+
+    def check_values(self, compiled: CompiledExpression, columns: Mapping[str, Any]) -> None:
+        for name in compiled.variables:
+            value = columns[name]
+            if np is not None and isinstance(value, np.ndarray):
+                if value.dtype.kind not in "iuf":
+                    raise ExpressionError(f"The value for '{name}' must be a number")
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    self.check_number(name, item)
+            else:
+                self.check_number(name, value)
+
+    def evaluate(self, expression: str, variables: Mapping[str, Any] = None) -> Any:
+        compiled = self.compile(expression)
+        variables = variables or {}
+        self.check_variables(compiled, variables)
+        for name in compiled.variables:
+            self.check_number(name, variables[name])
+        namespace = {**self.scalar_namespace, **{name: variables[name] for name in compiled.variables}}
+        return eval(compiled.code, {"__builtins__": None}, namespace)
+
+    def evaluate_batch(self, expression: str, bindings: Union[Mapping[str, Sequence[Any]], List[Mapping[str, Any]]]) -> List[Any]:
+        """Evaluate one expression for every binding.
+
+        `bindings` is either a list of {name: value} dicts or a dict of equally long
+        value lists (scalars are broadcast). Returns one result per binding.
+        """
+        compiled = self.compile(expression)
+        if isinstance(bindings, Mapping):
+            columns = dict(bindings)
+        else:
+            columns = {name: [binding[name] for binding in bindings] for name in compiled.variables if all(name in b for b in bindings)}
+        self.check_variables(compiled, columns)
+        self.check_values(compiled, columns)
+
+        lengths = {len(v) for v in columns.values() if isinstance(v, (list, tuple)) or (np is not None and isinstance(v, np.ndarray))}
+        if len(lengths) > 1:
+            raise ExpressionError("All variable value lists must have the same length")
+        size = lengths.pop() if lengths else 1
+
+        if self.numpy_namespace is None:
+            rows = [
+                {name: (value[i] if isinstance(value, (list, tuple)) else value) for name, value in columns.items()}
+                for i in range(size)
+            ]
+            return [self.evaluate(expression, row) for row in rows]
+
+        arrays = {name: np.asarray(columns[name], dtype=np.float64) for name in compiled.variables}
+        namespace = {**self.numpy_namespace, **arrays}
+        with np.errstate(all="ignore"):
+            result = eval(compiled.code, {"__builtins__": None}, namespace)
+        return np.broadcast_to(np.asarray(result, dtype=np.float64), (size,)).tolist()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "cached": len(self.cache)}
@@ -0,0 +1,80 @@
+import copy
+import json
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+# Trackers and ad networks that never carry page content
+TRACKER_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "doubleclick.net",
+    "facebook.net", "connect.facebook.net", "hotjar.com", "segment.io", "segment.com", "mixpanel.com",
+    "newrelic.com", "nr-data.net", "scorecardresearch.com", "quantserve.com", "taboola.com", "outbrain.com",
+    "criteo.com", "adnxs.com", "amazon-adsystem.com", "clarity.ms", "optimizely.com",
+)
+WAIT_CONDITIONS = ("commit", "domcontentloaded", "load", "networkidle")
+
+def site_of(host: str) -> str:
+    # Last two labels; good enough to tell a page's own CDN subdomains from other sites
+    return ".".join(host.lower().rstrip(".").split(".")[-2:]) if host else ""
+
+def matches_domain(host: str, domains: Iterable[str]) -> bool:
+    host = (host or "").lower()
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+class FetchProfile:
+    """How WebScraper fetches a page.
+
+    Only the HTML is kept, so by default images, media, fonts and stylesheets are
+    aborted through request routing along with known trackers, and navigation waits for
+    DOMContentLoaded instead of the full load event. `wait_until` can also be "load" or
+    "networkidle", and `wait_for_selector` additionally waits for an element. `timeout`
+    caps the whole fetch in seconds. With `http_first`, the page is first fetched over
+    plain HTTP and the browser is only used when that HTML has nothing to extract.
+    """
+
+    def __init__(self, blocked_resource_types: Iterable[str] = ("image", "media", "font", "stylesheet"),
+                 blocked_domains: Iterable[str] = TRACKER_DOMAINS, block_third_party: bool = False,
+                 wait_until: str = "domcontentloaded", wait_for_selector: Optional[str] = None,
+                 timeout: float = 20.0, http_first: bool = True):
+        if wait_until not in WAIT_CONDITIONS:
+            raise ValueError(f"wait_until must be one of {', '.join(WAIT_CONDITIONS)}")
+        self.blocked_resource_types = frozenset(blocked_resource_types)
+        self.blocked_domains = tuple(blocked_domains)
+        self.block_third_party = block_third_party
+        self.wait_until = wait_until
+        self.wait_for_selector = wait_for_selector
+        self.timeout = timeout
+        self.http_first = http_first
+
+    def replace(self, **changes) -> "FetchProfile":
+        profile = copy.copy(self)
+        for name, value in changes.items():
+            setattr(profile, name, value)
+        return profile
+
+    @property
+    def cache_variant(self) -> str:
+        """The settings that shape the fetched HTML; pages fetched with different ones are cached apart."""
+        return json.dumps([sorted(self.blocked_resource_types), sorted(self.blocked_domains), self.block_third_party,
+                           self.wait_until, self.wait_for_selector, self.http_first])
+
+    @property
+    def blocks_requests(self) -> bool:
+        return bool(self.blocked_resource_types or self.blocked_domains or self.block_third_party)
+
+    def should_block(self, request_url: str, resource_type: str, page_url: str, main_document: bool = False) -> bool:
+        if main_document:
+            # The page itself, including its redirects
+            return False
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = urlsplit(request_url).hostname
+        if matches_domain(host, self.blocked_domains):
+            return True
+        return self.block_third_party and site_of(host) != site_of(urlsplit(page_url).hostname)
+
+PROFILES = {
+    # Plain HTTP when it is enough, otherwise a stripped-down browser load
+    "fast": FetchProfile(),
+    # For script-heavy pages that fill in their content after load
+    "full": FetchProfile(blocked_resource_types=("image", "media", "font"), wait_until="networkidle", timeout=45.0, http_first=False),
+}
@@ -1,6 +1,9 @@
-import requests
-from PIL import Image
-import io
+import asyncio
+import base64
+import json
+import httpx
+
+from background_loop import BackgroundLoop
 
 class FluxTool:
     description = 'Generates an image based on a text prompt and returns the result.'
@@ -11,43 +14,209 @@ class FluxTool:
                 'type': 'string',
                 'description': 'The text prompt to generate the image from.',
             },
+            'seed': {
+                'type': 'integer',
+                'description': 'Optional seed. The same prompt and seed always give the same image.',
+            },
+            'width': {
+                'type': 'integer',
+                'description': 'Optional image width in pixels, 256 to 1024 (default 1024). Smaller drafts are much faster.',
+            },
+            'height': {
+                'type': 'integer',
+                'description': 'Optional image height in pixels, 256 to 1024 (default 1024).',
+            },
+            'steps': {
+                'type': 'integer',
+                'description': 'Optional number of denoising steps, 1 to 8 (default 4). Fewer steps are faster but rougher.',
+            },
+            'guidance': {
+                'type': 'number',
+                'description': 'Optional guidance scale, 0 to 10 (default 1.0).',
+            },
         },
         'required': ['prompt'],
     }
+    # Matches the server's default FLUX_MAX_BATCH_SIZE so one turn can fill a batch
+    max_concurrency = 4
 
-    def __init__(self):
-        self.server_url = "http://127.0.0.1:8000/predict"
+    def __init__(self, server_url: str = "http://127.0.0.1:8000/predict", timeout: float = 300.0, connect_timeout: float = 5.0,
+                 max_retries: int = 2, retry_backoff: float = 0.5, max_connections: int = 8,
+                 output_format: str = "webp", quality: int = 90, thumbnail: int = None, use_jobs: bool = False):
+        self.server_url = server_url
+        self.jobs_url = server_url.rsplit("/", 1)[0] + "/jobs"
+        # With jobs, execute() returns as soon as the server has queued the image; the
+        # caller polls get_job() and shows the image when it is done
+        self.use_jobs = use_jobs
+        self.submitted_jobs = []
         self.default_prompt = "a cute kitty"
-        self.prompt = None
-        self.response = None
+        # WebP is much smaller than PNG for renders and quicker to encode; st.image takes the bytes as they are
+        self.output_format = output_format
+        self.quality = quality
+        self.thumbnail = thumbnail
+        # Called as preview_callback(prompt, image_bytes, step, steps) when the server streams previews
+        self.preview_callback = None
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        # The connection pool is bound to the loop it was created on, so it lives on the
+        # background loop and is shared by every turn of the session
+        self.background_loop = BackgroundLoop.get()
+        self.client = None
+        self.background_loop.on_shutdown(self.close_client)
 
-    def send_request(self, prompt=None):
-        """Send a request to the server with the given prompt."""
+    def get_client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self.client
+
+    async def close_client(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    @staticmethod
+    def is_event_stream(response: httpx.Response) -> bool:
+        # A server started with --stream answers with newline-delimited JSON events instead of an image
+        content_type = response.headers.get("Content-Type", "")
+        return response.status_code == 200 and not content_type.startswith(("image/", "application/json"))
+
+    async def post(self, payload: dict) -> httpx.Response:
+        """POST to the server, retrying connection failures and 5xx responses with exponential backoff.
+
+        The body is read before returning unless the server is streaming events, which
+        are then read with read_events().
+        """
+        client = self.get_client()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.send(client.build_request("POST", self.server_url, json=payload), stream=True)
+                if response.status_code < 500 or attempt == self.max_retries:
+                    if not self.is_event_stream(response):
+                        await response.aread()
+                        await response.aclose()
+                    return response
+                await response.aclose()
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError):
+                if attempt == self.max_retries:
+                    raise
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def read_events(self, response: httpx.Response):
+        try:
+            async for line in response.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            await response.aclose()
+
+    def build_payload(self, prompt=None, seed: int = None, **options) -> dict:
         if prompt is None:
             prompt = self.default_prompt
-        
-        self.prompt = prompt
-        self.response = requests.post(self.server_url, json={"prompt": self.prompt})
-        return self.response.status_code
-    
-    def query_flux(self, prompt: str):
+
+        payload = {"prompt": prompt, "format": self.output_format}
+        if self.output_format != "png":
+            payload["quality"] = self.quality
+        if self.thumbnail:
+            payload["thumbnail"] = self.thumbnail
+        if seed is not None:
+            payload["seed"] = seed
+        payload.update({name: value for name, value in options.items() if value is not None})
+        payload["preview"] = self.preview_callback is not None
+        return payload
+
+    async def send_request(self, prompt=None, seed: int = None, **options) -> httpx.Response:
+        """Send a request to the server with the given prompt."""
+        return await self.background_loop.run(self.post(self.build_payload(prompt, seed, **options)))
+
+    async def request_json(self, method: str, url: str, **kwargs) -> dict:
+        response = await self.get_client().request(method, url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def submit_job(self, prompt: str, seed: int = None, **options) -> dict:
+        """Queue an image on the server and return the job, including its id and the queue depth."""
+        payload = self.build_payload(prompt, seed, **options)
+        # Nobody watches a background job, so previews would be wasted work
+        payload["preview"] = False
+        return await self.background_loop.run(self.request_json("POST", self.jobs_url, json=payload))
+
+    # The job helpers below are synchronous so Streamlit fragments, which run outside main()'s loop, can poll
+
+    def take_submitted_jobs(self) -> list:
+        """Return the jobs submitted since the last call, as {'job_id', 'prompt'} dicts."""
+        jobs, self.submitted_jobs = self.submitted_jobs, []
+        return jobs
+
+    def get_job(self, job_id: str) -> dict:
+        """Return the job's status; once it is done, 'image' holds the encoded image bytes."""
+        job = self.background_loop.run_sync(self.request_json("GET", f"{self.jobs_url}/{job_id}"))
+        if job.get("image"):
+            job["image"] = base64.b64decode(job["image"])
+        return job
+
+    def cancel_job(self, job_id: str) -> dict:
+        return self.background_loop.run_sync(self.request_json("DELETE", f"{self.jobs_url}/{job_id}"))
+
+    def get_job_stats(self) -> dict:
+        return self.background_loop.run_sync(self.request_json("GET", self.jobs_url))
+
+    async def query_flux(self, prompt: str, seed: int = None, **options):
         """Handles the full process of sending a request and processing the response."""
-        status = self.send_request(prompt)  # Send the prompt to the server and get status
-        return self.process_response(), status  # Process the response and return the image and status
-    
-    def process_response(self):
-        """Process the server response, returning the image if successful."""
-        if self.response.status_code == 200:
-            image = Image.open(io.BytesIO(self.response.content))
-            return image
-        else:
-            print(f"Failed to retrieve image. Response:\n{self.response.text}")
-            return None
-
-    async def execute(self, prompt: str):
-        image, status = self.query_flux(prompt)
+        response = await self.send_request(prompt, seed, **options)  # Send the prompt to the server
+        if response.status_code != 200:
+            return {'status': response.status_code, 'seed': seed, 'cached': False, 'response': None, 'thumbnail': None,
+                    'error': f"The image server answered {response.status_code}: {response.text}"}
+        if not self.is_event_stream(response):
+            image, thumbnail = self.process_response(response)  # Process the response into encoded image bytes
+            return {
+                'status': response.status_code,
+                # The server picks a seed when none is given; keep it so the image can be reproduced
+                'seed': int(response.headers['X-Seed']) if 'X-Seed' in response.headers else seed,
+                'cached': response.headers.get('X-Cache') == 'hit',
+                'response': image,
+                'thumbnail': thumbnail,
+            }
+
+        final = None
+        async for event in self.background_loop.stream(self.read_events(response)):
+            if event['type'] == 'preview' and self.preview_callback is not None:
+                self.preview_callback(prompt, base64.b64decode(event['image']), event['step'], event['steps'])
+            elif event['type'] == 'image':
+                final = event
+        if final is None:
+            return {'status': 500, 'seed': seed, 'cached': False, 'response': None, 'thumbnail': None,
+                    'error': 'The image stream ended without an image'}
         return {
-            'prompt': prompt,
-            'status': status,
-            'response': image
+            'status': response.status_code,
+            'seed': final['seed'],
+            'cached': final['cached'],
+            'response': base64.b64decode(final['image']),
+            'thumbnail': base64.b64decode(final['thumbnail']) if 'thumbnail' in final else None,
         }
+
+    def process_response(self, response: httpx.Response):
+        """Process a successful server response, returning the encoded image bytes.
+
+        The bytes are passed through undecoded; when a thumbnail was requested the server
+        sends both images base64-encoded in JSON, and both are returned.
+        """
+        if response.headers.get("Content-Type", "").startswith("application/json"):
+            body = response.json()
+            return base64.b64decode(body["image"]), base64.b64decode(body["thumbnail"])
+        return response.content, None
+
+    async def execute(self, prompt: str, seed: int = None, width: int = None, height: int = None, steps: int = None, guidance: float = None):
+        options = {'width': width, 'height': height, 'steps': steps, 'guidance': guidance}
+        if self.use_jobs:
+            try:
+                job = await self.submit_job(prompt, seed, **options)
+            except httpx.HTTPStatusError as e:
+                # 429 when the server queue is full
+                return {'prompt': prompt, 'status': e.response.status_code, 'error': e.response.text}
+            self.submitted_jobs.append({'job_id': job['job_id'], 'prompt': prompt})
+            return {'prompt': prompt, 'status': job['status'], 'job_id': job['job_id'], 'queue_depth': job['queue_depth'],
+                    'message': 'The image is being generated and will be added to the chat when it is ready.'}
+        result = await self.query_flux(prompt, seed, **options)
+        return {'prompt': prompt, **result}
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str) -> str:
+    """Canonicalize a URL so trivially different spellings share a cache entry."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+class ScrapeCache:
+    """Two-tier cache of scraped pages keyed by normalized URL and fetch variant.
+
+    The variant tells apart fetches of one URL that can give different HTML, such as a
+    browser load that waited for a selector versus a plain HTTP fetch (see
+    FetchProfile.cache_variant).
+
+    Entries hold the raw HTML and the extracted data. The memory tier is an LRU bounded
+    by `max_memory_bytes`; entries pushed out of it stay on disk under `cache_dir`,
+    which is bounded by `max_disk_bytes` and evicts least recently used files first.
+    Every entry expires `ttl` seconds after it was stored. Safe to use from several threads.
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, cache_dir: Optional[str] = None, ttl: float = 900.0, max_memory_bytes: int = 32 * 1024 * 1024,
+                 max_disk_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "web_scraper_cache")
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.memory_bytes = 0
+        self.disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self.disk_bytes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.load_disk_index()
+
+    @classmethod
+    def shared(cls) -> "ScrapeCache":
+        """Return the process-wide cache with default settings, shared by every session."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def key_for(url: str, variant: str = "") -> str:
+        name = normalize_url(url)
+        if variant:
+            name = f"{name}\n{variant}"
+        return hashlib.sha256(name.encode("utf-8")).hexdigest()
+
+    def path_for(self, url: str, variant: str = "") -> str:
+        return os.path.join(self.cache_dir, f"{self.key_for(url, variant)}.json")
+
+    def load_disk_index(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-len(".json")], stat.st_size))
+        # Oldest first, so the front of the index is the next eviction candidate
+        for _, key, size in sorted(files):
+            self.disk_index[key] = size
+            self.disk_bytes += size
+        self.evict_disk()
+
+    def get(self, url: str, variant: str = "") -> Optional[Dict[str, Any]]:
+        """Return the cached entry for url, or None on a miss or an expired entry."""
+        key = self.key_for(url, variant)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self.memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry
+                self.drop(key)
+                self.stats["expired"] += 1
+                return None
+
+            if key in self.disk_index:
+                entry = self.read_disk(key)
+                if entry is not None and entry["expires_at"] > now:
+                    self.disk_index.move_to_end(key)
+                    self.store_memory(key, entry)
+                    self.stats["disk_hits"] += 1
+                    return entry
+                self.drop(key)
+                self.stats["expired"] += 1
+                return None
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, url: str, html: str, extracted_data: Any, ttl: Optional[float] = None, variant: str = "") -> Dict[str, Any]:
+        key = self.key_for(url, variant)
+        entry = {
+            "url": normalize_url(url),
+            "html": html,
+            "extracted_data": extracted_data,
+            "expires_at": time.time() + (self.ttl if ttl is None else ttl),
+        }
+        with self.lock:
+            self.drop(key)
+            self.write_disk(key, entry)
+            self.store_memory(key, entry)
+        return entry
+
+    def invalidate(self, url: str, variant: str = ""):
+        with self.lock:
+            self.drop(self.key_for(url, variant))
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.disk_index):
+                self.drop(key)
+            self.memory.clear()
+            self.memory_bytes = 0
+
+    @staticmethod
+    def entry_size(entry: Dict[str, Any]) -> int:
+        return len(entry["html"]) + len(json.dumps(entry["extracted_data"]))
+
+    def store_memory(self, key: str, entry: Dict[str, Any]):
+        size = self.entry_size(entry)
+        if size > self.max_memory_bytes:
+            return
+        entry["size"] = size
+        self.memory[key] = entry
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= evicted["size"]
+            self.stats["evictions"] += 1
+
+    def read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def write_disk(self, key: str, entry: Dict[str, Any]):
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        data = json.dumps({k: v for k, v in entry.items() if k != "size"}).encode("utf-8")
+        if len(data) > self.max_disk_bytes:
+            return
+        # Write then rename so a crash never leaves a truncated entry behind
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.disk_index[key] = len(data)
+        self.disk_bytes += len(data)
+        self.evict_disk()
+
+    def evict_disk(self):
+        while self.disk_bytes > self.max_disk_bytes and self.disk_index:
+            key, size = self.disk_index.popitem(last=False)
+            self.disk_bytes -= size
+            self.remove_file(key)
+            self.stats["evictions"] += 1
+
+    def remove_file(self, key: str):
+        try:
+            os.remove(os.path.join(self.cache_dir, f"{key}.json"))
+        except FileNotFoundError:
+            pass
+
+    def drop(self, key: str):
+        entry = self.memory.pop(key, None)
+        if entry is not None:
+            self.memory_bytes -= entry["size"]
+        size = self.disk_index.pop(key, None)
+        if size is not None:
+            self.disk_bytes -= size
+            self.remove_file(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"] + self.stats["expired"]
+            return {
+                **self.stats,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": len(self.disk_index),
+                "disk_bytes": self.disk_bytes,
+            }
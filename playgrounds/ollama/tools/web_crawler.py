@@ -0,0 +1,141 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+from tools.fetch_profile import site_of
+from tools.scrape_cache import normalize_url
+from tools.web_scraper import WebScraper
+
+class HostRateLimiter:
+    """Spaces out fetches to the same host by at least 1 / requests_per_second seconds.
+
+    Each caller reserves the next free slot for its host before sleeping, so concurrent
+    callers queue up without a lock. Use from a single event loop.
+    """
+
+    def __init__(self, requests_per_second: float = 2.0):
+        self.interval = 1.0 / requests_per_second
+        self.next_slot: Dict[str, float] = {}
+
+    async def wait(self, url: str):
+        host = (urlsplit(url).hostname or "").lower()
+        now = time.monotonic()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class WebCrawler:
+    """Fetches several pages in one tool call, optionally following same-site links.
+
+    Shares the scraper's browser pool, fetch profile and cache. At most `max_concurrency`
+    pages are fetched at once, fetches to one host are rate limited, and the pages come
+    back as a single payload so the model needs one round trip instead of one per page.
+    """
+
+    def __init__(self, scraper: WebScraper, max_concurrency: int = 8, requests_per_second: float = 2.0,
+                 max_pages: int = 30, max_blocks_per_page: int = 10):
+        self.scraper = scraper
+        self.page_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_pages = max_pages
+        self.max_blocks_per_page = max_blocks_per_page
+        # Each crawl already fans out; a couple of crawls at once is plenty
+        self.max_concurrency = 2
+        self.name = "web_crawler"
+        self.description = "Scrapes several web pages at once, optionally following links on the same site, and returns their structured content together."
+        self.parameters = {
+            "type": "object",
+            "properties": {
+                "urls": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "The URLs of the web pages to scrape."
+                },
+                "follow_links": {
+                    "type": "boolean",
+                    "description": "Optional. Also scrape links found on the pages that stay on the same site."
+                },
+                "max_depth": {
+                    "type": "integer",
+                    "description": "Optional. How many links deep to follow when follow_links is set (default 1)."
+                },
+                "max_pages": {
+                    "type": "integer",
+                    "description": f"Optional. The most pages to scrape in total (default 10, at most {max_pages})."
+                }
+            },
+            "required": ["urls"]
+        }
+        self.instructions = """Using these scraped pages, create a structured JSON response that combines the most relevant and important information from all of them.
+Mention which page each piece of information came from. Do not include HTML tags or unnecessary details.
+Ensure your response is in valid JSON format without any additional text or comments."""
+
+    @staticmethod
+    def same_site_links(page_url: str, extracted_data: List[Dict[str, Any]]) -> List[str]:
+        site = site_of(urlsplit(page_url).hostname)
+        links = []
+        for block in extracted_data:
+            for link in block.get("links", []):
+                url, _ = urldefrag(urljoin(page_url, link["href"]))
+                parts = urlsplit(url)
+                if parts.scheme in ("http", "https") and site_of(parts.hostname) == site:
+                    links.append(url)
+        return links
+
+    async def crawl(self, urls: List[str], follow_links: bool = False, max_depth: int = 1, max_pages: int = 10) -> Dict[str, Any]:
+        max_pages = max(1, min(max_pages, self.max_pages))
+        max_depth = max_depth if follow_links else 0
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+        limiter = HostRateLimiter(self.requests_per_second)
+        profile = self.scraper.resolve_profile()
+
+        async def fetch(url: str, depth: int) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    extracted_data = await self.scraper.get_page(url, profile, throttle=limiter.wait)
+                    return {"url": url, "depth": depth, "extracted_data": extracted_data}
+                except Exception as e:
+                    return {"url": url, "depth": depth, "error": str(e)}
+
+        seen = set()
+        level = []
+        for url in urls:
+            if normalize_url(url) not in seen and len(seen) < max_pages:
+                seen.add(normalize_url(url))
+                level.append(url)
+
+        pages = []
+        for depth in range(max_depth + 1):
+            if not level:
+                break
+            results = await asyncio.gather(*(fetch(url, depth) for url in level))
+            pages.extend(results)
+            level = []
+            if depth == max_depth:
+                break
+            # Links are queued in page order, so the first pages' links win when max_pages runs out
+            for result in results:
+                for link in self.same_site_links(result["url"], result.get("extracted_data", [])):
+                    key = normalize_url(link)
+                    if key not in seen and len(seen) < max_pages:
+                        seen.add(key)
+                        level.append(link)
+
+        for page in pages:
+            if "extracted_data" in page:
+                page["extracted_data"] = page["extracted_data"][:self.max_blocks_per_page]
+        return {
+            "urls": urls,
+            "pages": pages,
+            "page_count": len(pages),
+            "failed": sum(1 for page in pages if "error" in page or not page.get("extracted_data")),
+        }
+
+    async def execute(self, urls: List[str], follow_links: bool = False, max_depth: int = 1, max_pages: int = 10) -> Dict[str, Any]:
+        if isinstance(urls, str):
+            # Models sometimes pass a single URL or a comma-separated string
+            urls = [url.strip() for url in urls.split(",") if url.strip()]
+        follow_links = str(follow_links).lower() in ("true", "1", "yes")
+        return await self.crawl(urls, follow_links, int(max_depth), int(max_pages))
@@ -1,18 +1,41 @@
 import asyncio
-import tempfile
-import uuid
 import os
-from typing import Dict, List
-from playwright.async_api import async_playwright
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
 from playwright_stealth import stealth_async
-from bs4 import BeautifulSoup
 import streamlit as st
 
+from background_loop import BackgroundLoop
+from tools.browser_pool import BrowserPool
+from tools.fetch_profile import FetchProfile, PROFILES
+from tools.html_extractor import extract_blocks
+from tools.scrape_cache import ScrapeCache
+
+# Sent on the plain HTTP path so sites answer as they would to the browser
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
 class WebScraper:
-    def __init__(self, headless: bool = True, browser_type: str = "chromium"):
+    def __init__(self, headless: bool = True, browser_type: str = "chromium", max_browsers: int = 2, max_open_pages: int = 4,
+                 cache: ScrapeCache = None, profile: FetchProfile = None, max_http_bytes: int = 5 * 1024 * 1024):
         self.headless = headless
         self.browser_type = browser_type
         self.last_scraped_file = None
+        # Browsers are tied to the event loop that launched them, so the pool lives on the
+        # background loop and survives Streamlit reruns
+        self.background_loop = BackgroundLoop.get()
+        self.pool = BrowserPool(browser_type=browser_type, headless=headless, max_browsers=max_browsers, max_open_pages=max_open_pages)
+        self.background_loop.on_shutdown(self.pool.close)
+        self.max_concurrency = self.pool.capacity
+        self.cache = cache if cache is not None else ScrapeCache.shared()
+        self.profile = profile if profile is not None else PROFILES["fast"]
+        self.max_http_bytes = max_http_bytes
+        self.http_client = None
+        self.background_loop.on_shutdown(self.close_http_client)
+        self.fetch_stats = {"http": 0, "browser": 0, "blocked_requests": 0}
         self.name = "web_scraper"
         self.description = "Scrapes the content of a web page and returns structured data including titles, links, and content."
         self.parameters = {
@@ -21,6 +44,15 @@ class WebScraper:
                 "url": {
                     "type": "string",
                     "description": "The URL of the web page to scrape."
+                },
+                "profile": {
+                    "type": "string",
+                    "enum": list(PROFILES),
+                    "description": "Optional. 'fast' (default) suits most pages; 'full' waits for script-heavy pages to finish loading."
+                },
+                "wait_for": {
+                    "type": "string",
+                    "description": "Optional CSS selector to wait for before reading the page."
                 }
             },
             "required": ["url"]
@@ -29,53 +61,124 @@ class WebScraper:
 Focus on the main content. Do not include HTML tags or unnecessary details.
 Ensure your response is in valid JSON format without any additional text or comments."""
 
-    async def scrape_page(self, url: str) -> str:
-        async with async_playwright() as p:
-            browser = await getattr(p, self.browser_type).launch(headless=self.headless)
-            context = await browser.new_context()
-            page = await context.new_page()
+    def get_http_client(self) -> httpx.AsyncClient:
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(headers=HTTP_HEADERS, follow_redirects=True)
+        return self.http_client
+
+    async def close_http_client(self):
+        if self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+
+    def resolve_profile(self, profile: Optional[str] = None, wait_for: Optional[str] = None) -> FetchProfile:
+        resolved = PROFILES[profile] if profile in PROFILES else self.profile
+        if wait_for:
+            # Plain HTTP cannot wait for an element to appear
+            resolved = resolved.replace(wait_for_selector=wait_for, http_first=False)
+        return resolved
+
+    async def fetch_static(self, url: str, profile: FetchProfile) -> Optional[str]:
+        """Fetch the page without a browser; None when the response is not usable HTML."""
+        async with self.get_http_client().stream("GET", url, timeout=profile.timeout) as response:
+            content_type = response.headers.get("Content-Type", "")
+            if response.status_code != 200 or "html" not in content_type:
+                return None
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > self.max_http_bytes:
+                    return None
+            return body.decode(response.encoding or "utf-8", errors="replace")
 
+    async def fetch_html(self, url: str, profile: FetchProfile = None) -> str:
+        profile = profile or self.profile
+        async with self.pool.page() as page:
+            await stealth_async(page)
+            if profile.blocks_requests:
+                # Tracks redirects of the page itself, so "third party" means relative to where it ends up
+                page_url = [url]
+
+                async def route(route):
+                    request = route.request
+                    main_document = request.is_navigation_request() and request.frame == page.main_frame
+                    if main_document:
+                        page_url[0] = request.url
+                    if profile.should_block(request.url, request.resource_type, page_url[0], main_document):
+                        self.fetch_stats["blocked_requests"] += 1
+                        await route.abort()
+                    else:
+                        await route.continue_()
+
+                await page.route("**/*", route)
+            await page.goto(url, wait_until=profile.wait_until, timeout=profile.timeout * 1000)
+            if profile.wait_for_selector:
+                await page.wait_for_selector(profile.wait_for_selector, timeout=profile.timeout * 1000)
+            return await page.content()
+
+    async def scrape_and_extract(self, url: str, profile: FetchProfile = None) -> Tuple[str, List[Dict[str, str]]]:
+        """Fetch a page and extract its blocks, trying plain HTTP first when the profile allows it."""
+        profile = profile or self.profile
+        if profile.http_first:
             try:
-                await stealth_async(page)
-                await page.goto(url)
-                html_content = await page.content()
-                
-                with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.html', prefix=f'{uuid.uuid4()}_') as temp_file:
-                    temp_file.write(html_content)
-                    self.last_scraped_file = temp_file.name
-                
-            except Exception as e:
-                st.error(f"Error scraping page: {e}")
-                html_content = ""
-            finally:
-                await browser.close()
+                html_content = await self.background_loop.run(self.fetch_static(url, profile))
+            except Exception:
+                # Whatever went wrong, the browser gets its turn
+                html_content = None
+            if html_content:
+                # Parsing is CPU-bound, so it runs on a worker thread instead of blocking the event loop
+                extracted_data = await asyncio.to_thread(self.extract_titles_articles_links, html_content)
+                # Pages that build their content with scripts have nothing to extract yet and need the browser
+                if extracted_data:
+                    self.fetch_stats["http"] += 1
+                    return html_content, extracted_data
+
+        try:
+            # A hard cap on the whole fetch, whatever the page keeps loading
+            html_content = await self.background_loop.run(asyncio.wait_for(self.fetch_html(url, profile), profile.timeout))
+            self.fetch_stats["browser"] += 1
+        except Exception as e:
+            st.error(f"Error scraping page: {e}")
+            html_content = ""
+        return html_content, await asyncio.to_thread(self.extract_titles_articles_links, html_content)
 
+    async def scrape_page(self, url: str, profile: FetchProfile = None) -> str:
+        html_content, _ = await self.scrape_and_extract(url, profile)
         return html_content
 
+    async def close(self):
+        await self.background_loop.run(self.pool.close())
+
     @staticmethod
     def extract_titles_articles_links(raw_html: str) -> List[Dict[str, str]]:
-        soup = BeautifulSoup(raw_html, 'html.parser')
-        extracted_data = []
-        
-        main_content = soup.find('main') or soup.find('body')
-        
-        for article in main_content.find_all(['article', 'section', 'div'], recursive=False):
-            title_tag = article.find(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-            link_tags = article.find_all('a', href=True)
-            content = article.get_text(separator="\n", strip=True)
-            
-            if title_tag and content:
-                extracted_data.append({
-                    'title': title_tag.get_text(strip=True),
-                    'links': [{'text': link.get_text(strip=True), 'href': link['href']} for link in link_tags],
-                    'content': content[:1000]  # Limit content to 1000 characters
-                })
-        
+        # One streaming pass over the page; html.parser repairs bad nesting the way the old BeautifulSoup code did
+        return extract_blocks(raw_html, max_content=1000)
+
+    async def get_page(self, url: str, profile: FetchProfile = None, throttle: Callable[[str], Awaitable[None]] = None) -> List[Dict[str, str]]:
+        """Return the extracted blocks of a page, from the cache when possible.
+
+        throttle(url) is awaited before a page is actually fetched, so cache hits skip it.
+        Entries are kept per profile, so a page loaded with another profile or wait_for
+        selector is fetched again rather than served from a different fetch.
+        """
+        profile = profile or self.profile
+        entry = await asyncio.to_thread(self.cache.get, url, profile.cache_variant)
+        if entry is not None:
+            return entry["extracted_data"]
+        if throttle is not None:
+            await throttle(url)
+        raw_html, extracted_data = await self.scrape_and_extract(url, profile)
+        # Failed scrapes come back empty and are not worth remembering
+        if raw_html:
+            await asyncio.to_thread(self.cache.set, url, raw_html, extracted_data, None, profile.cache_variant)
         return extracted_data
 
-    async def query_page_content(self, url: str) -> Dict[str, any]:
-        raw_html = await self.scrape_page(url)
-        extracted_data = self.extract_titles_articles_links(raw_html)
+    async def query_page_content(self, url: str, profile: str = None, wait_for: str = None) -> Dict[str, any]:
+        fetch_profile = self.resolve_profile(profile, wait_for)
+        extracted_data = await self.get_page(url, fetch_profile)
+        # Entries too large for the disk tier, failed scrapes and evicted files leave no file behind
+        path = self.cache.path_for(url, fetch_profile.cache_variant)
+        self.last_scraped_file = path if os.path.isfile(path) else None
         return {
             "url": url,
             "extracted_data": extracted_data,
@@ -0,0 +1,124 @@
+import asyncio
+import atexit
+import queue
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List
+
+class BackgroundLoop:
+    """An event loop running forever on a daemon thread.
+
+    Streamlit reruns a playground script from the top, and the ollama playground drives
+    main() with a fresh asyncio.run() loop on every rerun. Anything bound to an event
+    loop that should outlive a rerun (browsers, HTTP connection pools) lives on this
+    loop instead. Async code reaches it through run() and stream(), synchronous code
+    through run_sync() and iterate().
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="background-loop", daemon=True)
+        self.thread.start()
+        self.shutdown_callbacks: List[Callable[[], Awaitable[Any]]] = []
+        atexit.register(self.shutdown)
+
+    @classmethod
+    def get(cls) -> "BackgroundLoop":
+        """Return the process-wide loop, starting it on first use."""
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    async def run(self, coro: Awaitable[Any]) -> Any:
+        """Run a coroutine on the background loop and await its result from the calling loop."""
+        if asyncio.get_running_loop() is self.loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    async def stream(self, agen: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Iterate an async generator on the background loop and receive its items on the calling loop."""
+        caller_loop = asyncio.get_running_loop()
+        if caller_loop is self.loop:
+            async for item in agen:
+                yield item
+            return
+
+        items = asyncio.Queue()
+        finished = object()
+
+        def put(item, error=None):
+            try:
+                caller_loop.call_soon_threadsafe(items.put_nowait, (item, error))
+            except RuntimeError:
+                # The caller's loop has already closed; nobody is listening any more
+                pass
+
+        async def pump():
+            try:
+                async for item in agen:
+                    put(item)
+                put(finished)
+            except BaseException as e:
+                put(finished, e)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while True:
+                item, error = await items.get()
+                if item is finished:
+                    if error is not None and not isinstance(error, asyncio.CancelledError):
+                        raise error
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def run_sync(self, coro: Awaitable[Any], timeout: float = None) -> Any:
+        """Run a coroutine on the background loop from synchronous code."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def iterate(self, agen: AsyncIterator[Any]) -> Iterator[Any]:
+        """Iterate an async generator on the background loop from synchronous code.
+
+        Items are handed over as soon as they are produced. Abandoning the iterator
+        (a Streamlit stop or rerun raises inside the script) cancels the generator.
+        """
+        items = queue.Queue()
+        finished = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((item, None))
+                items.put((finished, None))
+            except BaseException as e:
+                items.put((finished, e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while True:
+                item, error = items.get()
+                if item is finished:
+                    if error is not None and not isinstance(error, asyncio.CancelledError):
+                        raise error
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def on_shutdown(self, callback: Callable[[], Awaitable[Any]]):
+        """Register a coroutine function to run on the loop before the process exits."""
+        self.shutdown_callbacks.append(callback)
+
+    def shutdown(self, timeout: float = 10.0):
+        if not self.loop.is_running():
+            return
+        for callback in reversed(self.shutdown_callbacks):
+            try:
+                self.run_sync(callback(), timeout)
+            except Exception as e:
+                print(f"Error during background loop shutdown: {e}")
+        self.shutdown_callbacks.clear()
+        self.loop.call_soon_threadsafe(self.loop.stop)
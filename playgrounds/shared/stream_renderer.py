@@ -0,0 +1,55 @@
+import time
+from typing import List
+
+class StreamRenderer:
+    """Shows a streamed response in a Streamlit placeholder without redrawing it per token.
+
+    Every redraw sends the whole text so far to the browser, so redrawing on each token
+    costs time quadratic in the response length. Chunks are collected in a list instead
+    and the placeholder is redrawn at most every `interval` seconds, or sooner once
+    `flush_chars` characters are waiting. finalize() draws the finished text once,
+    without the cursor. Used as a context manager, it finalizes on exit.
+    """
+
+    def __init__(self, placeholder, interval: float = 0.1, flush_chars: int = 2048, cursor: str = "▌"):
+        self.placeholder = placeholder
+        self.interval = interval
+        self.flush_chars = flush_chars
+        self.cursor = cursor
+        self.parts: List[str] = []
+        self.pending_chars = 0
+        self.last_flush = time.monotonic()
+        self.finalized = False
+
+    @property
+    def text(self) -> str:
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+        return self.parts[0] if self.parts else ""
+
+    def write(self, chunk: str):
+        if not chunk:
+            return
+        self.parts.append(chunk)
+        self.pending_chars += len(chunk)
+        if self.pending_chars >= self.flush_chars or time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending_chars:
+            self.placeholder.markdown(self.text + self.cursor)
+        self.pending_chars = 0
+        self.last_flush = time.monotonic()
+
+    def finalize(self) -> str:
+        """Draw the complete text, once, and return it."""
+        if not self.finalized:
+            self.finalized = True
+            self.placeholder.markdown(self.text)
+        return self.text
+
+    def __enter__(self) -> "StreamRenderer":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.finalize()
@@ -7,6 +7,13 @@ import fitz  # PyMuPDF
 import pandas as pd
 from pydantic import BaseModel, Field, field_validator
 import time 
+import os
+import sys
+
+# Code shared by the playgrounds lives next to them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+from stream_renderer import StreamRenderer
+from retrieval import BM25Index, select_within_budget
 
 # Initialize OpenAI client
 client = OpenAI(
@@ -83,7 +90,9 @@ if "metrics" not in st.session_state:
 if "total_tokens" not in st.session_state:
     st.session_state.total_tokens = 0
 if "documents" not in st.session_state:
-    st.session_state.documents = []
+    st.session_state.documents = {}
+if "retrieval_index" not in st.session_state:
+    st.session_state.retrieval_index = BM25Index()
 if 'message_counter' not in st.session_state:
     st.session_state.message_counter = 0
     
@@ -103,21 +112,34 @@ system_message = st.sidebar.text_area("System Message", "You are a helpful assis
 st.sidebar.header("Document Upload (RAG)")
 uploaded_files = st.sidebar.file_uploader("Upload PDFs or Spreadsheets for RAG", accept_multiple_files=True, type=['pdf', 'xlsx', 'xls'])
 
-if uploaded_files:
-    for file in uploaded_files:
-        text_content = extract_text_from_file(file)
-        if text_content:
-            st.session_state.documents.append({
-                "title": file.name,
-                "text": text_content
-            })
-    st.sidebar.success(f"{len(uploaded_files)} document(s) uploaded successfully!")
+with st.sidebar.expander("Retrieval Settings"):
+    retrieval_top_k = st.slider("Top K Chunks", 1, 20, 5)
+    retrieval_token_budget = st.slider("Context Token Budget", 256, 8192, 1536, step=256)
+
+# Only files that are new since the last rerun are read and indexed
+uploaded_keys = {(file.name, file.size): file for file in uploaded_files or []}
+removed_keys = st.session_state.documents.keys() - uploaded_keys.keys()
+if removed_keys:
+    for key in removed_keys:
+        del st.session_state.documents[key]
+    # Postings cannot be taken back out, so the index is rebuilt from what is left
+    st.session_state.retrieval_index = BM25Index()
+    for doc in st.session_state.documents.values():
+        st.session_state.retrieval_index.add(doc["title"], doc["text"])
+new_files = [file for key, file in uploaded_keys.items() if key not in st.session_state.documents]
+for file in new_files:
+    text_content = extract_text_from_file(file)
+    if text_content:
+        chunk_count = st.session_state.retrieval_index.add(file.name, text_content)
+        st.session_state.documents[(file.name, file.size)] = {"title": file.name, "text": text_content, "chunks": chunk_count}
+if new_files:
+    st.sidebar.success(f"{len(new_files)} document(s) uploaded successfully!")
 
 # Display uploaded documents
 if st.session_state.documents:
     st.sidebar.subheader("Uploaded Documents")
-    for doc in st.session_state.documents:
-        st.sidebar.text(doc['title'])
+    for doc in st.session_state.documents.values():
+        st.sidebar.text(f"{doc['title']} ({doc['chunks']} chunks)")
 
 # Parameters
 with st.sidebar.expander("Parameters", expanded=True):
@@ -193,6 +215,14 @@ if prompt := st.chat_input("What is your message?"):
         # Prepare messages for the API call
     messages = [{"role": "system", "content": system_message}] + [{"role": m["role"], "content": m["content"]} for m in st.session_state.messages]
 
+    # Send only the chunks that best match the question, within the token budget, not whole documents
+    retrieved_chunks = select_within_budget(st.session_state.retrieval_index.search(prompt, retrieval_top_k), retrieval_token_budget)
+    if retrieved_chunks:
+        with st.expander(f"Retrieved {len(retrieved_chunks)} chunk(s)"):
+            for chunk in retrieved_chunks:
+                st.caption(f"{chunk['title']} (part {chunk['part']} of {chunk['parts']})")
+                st.text(chunk["text"])
+
         # Create ChatCompletionRequest object
     try:
         extra_body = {
@@ -210,7 +240,8 @@ if prompt := st.chat_input("What is your message?"):
                 "skip_special_tokens": skip_special_tokens,
                 "spaces_between_special_tokens": spaces_between_special_tokens,
                 "truncate_prompt_tokens": truncate_prompt_tokens,
-                "documents": st.session_state.documents if st.session_state.documents else None
+                "documents": [{"title": f"{chunk['title']} (part {chunk['part']} of {chunk['parts']})", "text": chunk["text"]}
+                              for chunk in retrieved_chunks] or None
             }
 
             # Add guided parameters if selected
@@ -250,14 +281,13 @@ if prompt := st.chat_input("What is your message?"):
         if stream:
             # Use Streamlit's native chat_message for streaming
             with st.chat_message("assistant"):
-                message_placeholder = st.empty()
-                for chunk in completion:
-                    if chunk.choices[0].delta.content is not None:
-                        full_response += chunk.choices[0].delta.content
-                        
+                with StreamRenderer(st.empty()) as renderer:
+                    for chunk in completion:
+                        if chunk.choices[0].delta.content is not None:
+                            renderer.write(chunk.choices[0].delta.content)
+                full_response = renderer.text
                 
                 message(full_response, key=get_unique_key())
-                message_placeholder.markdown(full_response)
 
         else:
             full_response = completion.choices[0].message.content
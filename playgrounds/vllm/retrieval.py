@@ -0,0 +1,119 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# Rough size of a token in English text; good enough to budget prompt space without a tokenizer
+CHARS_PER_TOKEN = 4
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def chunk_text(text: str, chunk_tokens: int = 256, overlap_tokens: int = 32) -> List[str]:
+    """Split text into chunks of about chunk_tokens, breaking between lines where possible.
+
+    PDF pages and spreadsheet rows both come out of extract_text_from_file one per line,
+    so lines are kept whole unless a single line is longer than a chunk. The last lines
+    of each chunk, up to overlap_tokens, are repeated at the start of the next one so a
+    passage cut at a boundary can still be found.
+    """
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for line in text.splitlines():
+        line = line.strip()
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(line[:cut])
+            line = line[cut:].strip()
+        if line:
+            pieces.append(line)
+
+    chunks, current, size = [], [], 0
+    for piece in pieces:
+        if current and size + len(piece) > max_chars:
+            chunks.append("\n".join(current))
+            carried, carried_size = [], 0
+            for previous in reversed(current):
+                if carried_size + len(previous) + 1 > overlap_chars:
+                    break
+                carried.insert(0, previous)
+                carried_size += len(previous) + 1
+            current, size = carried, carried_size
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+class BM25Index:
+    """An in-memory BM25 index over document chunks, built up as documents arrive.
+
+    add() chunks a document and updates the postings in place, so uploading another file
+    only costs that file. search() scores just the chunks that share a term with the
+    query.
+    """
+
+    def __init__(self, chunk_tokens: int = 256, overlap_tokens: int = 32, k1: float = 1.5, b: float = 0.75):
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.k1 = k1
+        self.b = b
+        self.chunks: List[Dict] = []
+        self.term_freqs: List[Counter] = []
+        self.lengths: List[int] = []
+        self.total_length = 0
+        # term -> ids of the chunks containing it
+        self.postings: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def add(self, title: str, text: str) -> int:
+        """Index a document; returns how many chunks it was split into."""
+        chunks = chunk_text(text, self.chunk_tokens, self.overlap_tokens)
+        for number, chunk in enumerate(chunks, start=1):
+            chunk_id = len(self.chunks)
+            terms = Counter(tokenize(chunk))
+            self.chunks.append({"title": title, "part": number, "parts": len(chunks), "text": chunk, "tokens": estimate_tokens(chunk)})
+            self.term_freqs.append(terms)
+            length = sum(terms.values())
+            self.lengths.append(length)
+            self.total_length += length
+            for term in terms:
+                self.postings.setdefault(term, []).append(chunk_id)
+        return len(chunks)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict]]:
+        """The k best chunks for the query as (score, chunk), best first."""
+        if not self.chunks:
+            return []
+        count = len(self.chunks)
+        average_length = self.total_length / count or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            chunk_ids = self.postings.get(term)
+            if not chunk_ids:
+                continue
+            idf = math.log(1 + (count - len(chunk_ids) + 0.5) / (len(chunk_ids) + 0.5))
+            for chunk_id in chunk_ids:
+                freq = self.term_freqs[chunk_id][term]
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.chunks[chunk_id]) for chunk_id, score in best]
+
+def select_within_budget(results: List[Tuple[float, Dict]], token_budget: int) -> List[Dict]:
+    """Take chunks in rank order, skipping any that would overflow the token budget."""
+    selected, used = [], 0
+    for _, chunk in results:
+        if used + chunk["tokens"] <= token_budget:
+            selected.append(chunk)
+            used += chunk["tokens"]
+    return selected